@@ -1,3 +1,5 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 from fastapi.security import OAuth2PasswordBearer
@@ -6,8 +8,12 @@ from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from models import User
 from database import get_db
-from sqlalchemy.orm import Session
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from utils import TTLCache
 import os
+import threading
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -16,10 +22,32 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 1440
 
+# Verified tokens and the users they resolve to are kept for this many seconds
+# (never past the token's own expiry), so repeated requests skip JWT decoding
+# and the user SELECT
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", 60))
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", 1024))
+
+_decoded_tokens = TTLCache(AUTH_CACHE_SIZE, AUTH_CACHE_TTL)
+_authenticated_users = TTLCache(AUTH_CACHE_SIZE, AUTH_CACHE_TTL)
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bcrypt runs on a small dedicated pool so logins never stall the event loop;
+# once PASSWORD_HASH_WORKERS checks are running and PASSWORD_HASH_QUEUE more are
+# waiting, further logins are turned away instead of piling up
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 2))
+PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", 8))
+
+_password_executor = ThreadPoolExecutor(
+    max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash"
+)
+_password_slots = threading.BoundedSemaphore(
+    PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE
+)
+
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
@@ -29,6 +57,28 @@ def get_password_hash(password):
     return pwd_context.hash(password)
 
 
+async def _run_password_task(fn, *args):
+    if not _password_slots.acquire(blocking=False):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many logins in progress, please retry",
+            headers={"Retry-After": "1"},
+        )
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_password_executor, fn, *args)
+    finally:
+        _password_slots.release()
+
+
+async def verify_password_async(plain_password, hashed_password):
+    return await _run_password_task(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password):
+    return await _run_password_task(get_password_hash, password)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -45,7 +95,11 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 
-def decode_access_token(token: str):
+def _decode_token(token: str):
+    """Returns the token's username and expiry timestamp, memoized per token."""
+    decoded = _decoded_tokens.get(token)
+    if decoded is not None:
+        return decoded
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
@@ -55,7 +109,10 @@ def decode_access_token(token: str):
                 detail="Invalid authentication credentials",
                 headers={"WWW-Authenticate": "Bearer"},
             )
-        return username
+        expires_at = payload.get("exp", time.time() + AUTH_CACHE_TTL)
+        decoded = (username, expires_at)
+        _decoded_tokens.set(token, decoded, ttl=expires_at - time.time())
+        return decoded
     except JWTError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -64,11 +121,27 @@ def decode_access_token(token: str):
         )
 
 
-def get_current_user(
-    token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
+def decode_access_token(token: str):
+    username, _ = _decode_token(token)
+    return username
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _forget_user(mapper, connection, target):
+    # Changed or removed users must authenticate against the database again
+    _authenticated_users.discard_where(lambda user: user.id == target.id)
+
+
+async def get_current_user(
+    token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)
 ):
+    user = _authenticated_users.get(token)
+    if user is not None:
+        return user
+
     try:
-        username = decode_access_token(token)
+        username, expires_at = _decode_token(token)
         if username is None:
             raise HTTPException(
                 status_code=401, detail="Invalid authentication credentials"
@@ -78,8 +151,11 @@ def get_current_user(
             status_code=401, detail="Invalid authentication credentials"
         )
 
-    user = db.query(User).filter(User.username == username).first()
+    user = await db.scalar(select(User).where(User.username == username))
     if user is None:
         raise HTTPException(status_code=404, detail="User not found")
 
+    # Cache a detached copy so it can be handed to later requests
+    db.expunge(user)
+    _authenticated_users.set(token, user, ttl=expires_at - time.time())
     return user
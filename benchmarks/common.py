@@ -0,0 +1,350 @@
+# benchmarks/common.py
+import asyncio
+import contextlib
+import itertools
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+SIZES = ["XS", "S", "M", "L", "XL"]
+PRODUCTS = [
+    ("Пиджак", "JACKET"),
+    ("Брюки", "TROUSERS"),
+    ("Рубашка", "SHIRT"),
+    ("Жилет", "VEST"),
+    ("Юбка", "SKIRT"),
+]
+
+
+def configure(db_path: str = None, **env):
+    """
+    Point the app at a scratch SQLite file and fill in the settings main.py needs.
+    Must run before the first import of database/main.
+    """
+    if db_path is None:
+        db_path = os.path.join(tempfile.mkdtemp(prefix="nis-bench-"), "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    for key, value in env.items():
+        os.environ[key] = str(value)
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+    os.environ.setdefault("MAIL_USERNAME", "benchmark")
+    os.environ.setdefault("MAIL_PASSWORD", "benchmark")
+    os.environ.setdefault("MAIL_FROM", "benchmark@example.com")
+    os.environ.setdefault("MAIL_PORT", "1025")
+    os.environ.setdefault("MAIL_SERVER", "localhost")
+    return db_path
+
+
+def tilda_payload(order_id, products=3, rng=random):
+    """A webhook body shaped like the ones Tilda sends."""
+    from utils import GRADES, LETTERS, SCHOOLS
+
+    items = []
+    for name, sku in rng.sample(PRODUCTS, products):
+        price = rng.choice([8000, 12000, 15000])
+        quantity = rng.randint(1, 2)
+        items.append(
+            {
+                "name": name,
+                "sku": sku,
+                "price": str(price),
+                "quantity": quantity,
+                "amount": str(price * quantity),
+                "options": [{"option": "Размер", "variant": rng.choice(SIZES)}],
+            }
+        )
+    return {
+        "Name": f"Parent {order_id}",
+        "Phone": f"+7 (707) {rng.randint(0, 9999999):07d}",
+        "Email": f"parent{order_id}@example.com",
+        "school": SCHOOLS[rng.randint(1, len(SCHOOLS))],
+        "grade": str(rng.choice(GRADES)),
+        "letter": rng.choice(LETTERS),
+        "paymentsystem": "kaspi",
+        "formid": "form-1",
+        "formname": "Cart",
+        "payment": {
+            "orderid": str(order_id),
+            "amount": str(sum(int(item["amount"]) for item in items)),
+            "products": items,
+        },
+    }
+
+
+# Values covering every branch of queries.filter_orders
+FILTER_VALUES = dict(
+    shipping_date=[None, "closest", "next", "previous"],
+    school=[None, 1],
+    grade_and_letter=[(None, None), ("7", None), ("7", "A")],
+    payed=[None, True, False],
+)
+
+
+def filter_combinations():
+    """Every combination of the GET /orders/ filters, as filter_orders kwargs."""
+    for shipping_date, school, (grade, letter), payed in itertools.product(
+        *FILTER_VALUES.values()
+    ):
+        yield dict(
+            shipping_date=shipping_date,
+            school=school,
+            grade=grade,
+            letter=letter,
+            payed=payed,
+        )
+
+
+def seed(
+    orders: int = 1000,
+    products_per_order: int = 3,
+    seed_value: int = 0,
+    shipping_dates: int = 9,
+):
+    """
+    Fill the configured database with a season of orders spread over
+    shipping_dates fortnightly shipping Sundays (starting two weeks after the
+    closest one and going back) and all schools, plus a "staff" user
+    (password "staff").
+    """
+    from auth import get_password_hash
+    from sqlalchemy import text
+    from database import create_schema, engine
+    from search import rebuild_search_index
+    from models import (
+        Base,
+        Customer,
+        Order,
+        Product,
+        ProductOption,
+        StatusChange,
+        StatusEnum,
+        User,
+    )
+    from utils import (
+        GRADES,
+        LETTERS,
+        SCHOOLS,
+        customer_contact_key,
+        get_next_shipping_day,
+    )
+
+    rng = random.Random(seed_value)
+    Base.metadata.drop_all(bind=engine)
+    create_schema(Base.metadata)
+
+    closest = get_next_shipping_day(datetime.now()).date()
+    shipping_dates = [
+        closest - timedelta(weeks=2 * i) for i in range(-1, shipping_dates - 1)
+    ]
+    statuses = list(StatusEnum)
+
+    customers, order_rows, products, options, changes = [], [], [], [], []
+    product_id = 0
+    for i in range(orders):
+        phone = f"+7 (707) {rng.randint(0, 9999999):07d}"
+        email = f"parent{i}@example.com"
+        customers.append(
+            {
+                "id": i + 1,
+                "name": f"Parent {i}",
+                "phone": phone,
+                "email": email,
+                "contact_key": customer_contact_key(email, phone),
+            }
+        )
+        status = rng.choice(statuses)
+        order_id = str(100000 + i)
+        total = Decimal(0)
+        for name, sku in rng.sample(PRODUCTS, products_per_order):
+            product_id += 1
+            price = Decimal(rng.choice([8000, 12000, 15000]))
+            quantity = rng.randint(1, 2)
+            total += price * quantity
+            products.append(
+                {
+                    "id": product_id,
+                    "order_id": order_id,
+                    "name": name,
+                    "sku": sku,
+                    "price": price,
+                    "quantity": quantity,
+                    "amount": price * quantity,
+                    "is_assembled": rng.random() < 0.3,
+                }
+            )
+            options.append(
+                {
+                    "product_id": product_id,
+                    "option_name": "Размер",
+                    "variant": rng.choice(SIZES),
+                }
+            )
+        order_rows.append(
+            {
+                "order_id": order_id,
+                "customer_id": i + 1,
+                "payment_system": "kaspi",
+                "status": status,
+                "school": SCHOOLS[rng.randint(1, len(SCHOOLS))],
+                "grade": rng.choice(GRADES),
+                "letter": rng.choice(LETTERS),
+                "total_amount": total,
+                "form_id": "form-1",
+                "form_name": "Cart",
+                "shipping_date": rng.choice(shipping_dates),
+            }
+        )
+        for step in statuses[: statuses.index(status) + 1]:
+            changes.append({"order_id": order_id, "status": step})
+
+    with engine.begin() as connection:
+        for model, rows in (
+            (Customer, customers),
+            (Order, order_rows),
+            (Product, products),
+            (ProductOption, options),
+            (StatusChange, changes),
+        ):
+            # An empty parameter list would insert a single row of defaults
+            if rows:
+                connection.execute(model.__table__.insert(), rows)
+        connection.execute(
+            User.__table__.insert(),
+            [{"username": "staff", "hashed_password": get_password_hash("staff")}],
+        )
+        if engine.dialect.name == "postgresql":
+            # Explicit ids do not advance the sequences later inserts use
+            for model in (Customer, Product):
+                table = model.__tablename__
+                connection.execute(
+                    text(
+                        f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                        f"(SELECT max(id) FROM {table}))"
+                    )
+                )
+    # The rows above bypassed ingestion, which keeps the index in sync
+    rebuild_search_index()
+    return [row["order_id"] for row in order_rows]
+
+
+def auth_headers(username: str = "staff"):
+    from auth import create_access_token
+
+    return {"Authorization": f"Bearer {create_access_token({'sub': username})}"}
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, round(p / 100 * (len(ordered) - 1)))
+    return ordered[index]
+
+
+def summarize(name, latencies, elapsed):
+    """One report line: throughput and latency percentiles in milliseconds."""
+    return {
+        "name": name,
+        "requests": len(latencies),
+        "throughput": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+async def timed(call):
+    start = time.perf_counter()
+    response = await call
+    response.raise_for_status()
+    return time.perf_counter() - start
+
+
+async def run_load(orders: int, operations, clients: int, make_request):
+    """
+    Seed orders, then send operations through the app from clients
+    concurrent clients. An operation is a (kind, value) pair; make_request
+    (order_ids, headers) returns the scenario's request(client, kind, value)
+    coroutine. Returns throughput and latencies per kind and in total, and
+    the responses that failed: server errors and lock timeouts (a 400, such
+    as a PATCH to the status an order already has, is expected).
+    """
+    import httpx
+    import main
+
+    order_ids = seed(orders=orders)
+    main.mailer.config.SUPPRESS_SEND = 1
+    request = make_request(order_ids, auth_headers())
+    latencies = {kind: [] for kind, _ in operations}
+    errors = []
+
+    # Lock timeouts surface as 500s to count, not as exceptions in the client
+    transport = httpx.ASGITransport(app=main.app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench", timeout=60
+    ) as client:
+        # The lifespan is not run by ASGITransport
+        if main.writer:
+            main.writer.start()
+        pending = iter(operations)
+
+        async def worker():
+            for kind, value in pending:
+                start = time.perf_counter()
+                response = await request(client, kind, value)
+                latencies[kind].append(time.perf_counter() - start)
+                if response.status_code >= 500 or "locked" in response.text:
+                    errors.append(response.text[:200])
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(clients)))
+        elapsed = time.perf_counter() - start
+
+    if main.writer:
+        await main.writer.stop()
+    await main.mailer.stop()
+    results = [summarize(kind, values, elapsed) for kind, values in latencies.items()]
+    results.append(summarize("total", sum(latencies.values(), []), elapsed))
+    return {"results": results, "errors": len(errors), "sample": errors[:3]}
+
+
+def print_report(coroutine):
+    """Run a benchmark coroutine, printing only its report, as JSON."""
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        report = asyncio.run(coroutine)
+    print(json.dumps(report))
+
+
+def compare(module: str, option: str, variants, args, forwarded):
+    """
+    Run python -m module once per variant, each in its own process on a fresh
+    database, passing --option=variant and the forwarded arguments that are
+    set, and print the report lines of each.
+    """
+    width = max(map(len, variants))
+    for variant in variants:
+        output = subprocess.run(
+            [sys.executable, "-m", module, f"--{option}={variant}"]
+            + [
+                f"--{name.replace('_', '-')}={getattr(args, name)}"
+                for name in forwarded
+                if getattr(args, name) is not None
+            ],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        report = json.loads(output.strip().splitlines()[-1])
+        kinds = max(len(line["name"]) for line in report["results"])
+        for line in report["results"]:
+            print(
+                f"{variant:>{width}} {line['name']:<{kinds}} {line['requests']:>5} "
+                f"req  {line['throughput']:>8} req/s  p50 {line['p50_ms']:>8} ms  "
+                f"p99 {line['p99_ms']:>8} ms"
+            )
+        print(f"{variant:>{width}} errors {report['errors']} {report['sample']}")
@@ -0,0 +1,166 @@
+# benchmarks/concurrent_load.py
+"""
+Tracking lookups measured while large GET /orders/ listings run concurrently,
+once per DATABASE_MODE, and once with the sync session called straight from
+the async handlers, as before DATABASE_MODE existed, so every query blocks the
+event loop. Each mode runs in its own process on a fresh database.
+
+    python -m benchmarks.concurrent_load --orders 3000 --listings 20 --lookups 400 --clients 8 --rate 40
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks.common import configure
+
+MODES = ["blocking", "sync", "async"]
+
+
+async def call_inline(fn, *args, **kwargs):
+    return fn(*args, **kwargs)
+
+
+async def run(args):
+    from benchmarks.common import auth_headers, seed, summarize
+
+    order_ids = seed(orders=args.orders)
+
+    import httpx
+    from main import app
+
+    if args.mode == "blocking":
+        import database
+
+        # ThreadedSession minus the threadpool: a plain Session used inside
+        # async def
+        database.run_in_threadpool = call_inline
+
+    if args.query_latency_ms:
+        from sqlalchemy import event
+        from sqlalchemy.util import await_only
+
+        from database import async_engine, engine
+
+        delay = args.query_latency_ms / 1000
+
+        def blocking_round_trip(*_):
+            # On the event loop in blocking mode, in a worker thread in sync mode
+            time.sleep(delay)
+
+        def awaited_round_trip(*_):
+            # An async driver awaits the server, so the loop serves others
+            await_only(asyncio.sleep(delay))
+
+        event.listen(engine, "before_cursor_execute", blocking_round_trip)
+        if async_engine:
+            event.listen(
+                async_engine.sync_engine, "before_cursor_execute", awaited_round_trip
+            )
+
+    headers = auth_headers()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        # Requests are timed from when they are due, not from when their
+        # coroutine gets to run, so time spent behind a blocked event loop
+        # counts; the listings are all due at the start
+        start = time.perf_counter()
+
+        async def listing():
+            response = await client.get(
+                "/orders/", params={"limit": 1000}, headers=headers
+            )
+            response.raise_for_status()
+            return time.perf_counter() - start
+
+        async def lookups(worker):
+            # Each client sends its share of the lookups on a fixed schedule;
+            # one that falls behind sends the next right away, still timed
+            # from when it was due
+            latencies = []
+            for i in range(worker, args.lookups, args.clients):
+                due = start + i / args.rate
+                await asyncio.sleep(due - time.perf_counter())
+                order_id = order_ids[i % len(order_ids)]
+                response = await client.get(f"/order-tracking/{order_id}")
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - due)
+            return latencies
+
+        listing_latencies, lookup_latencies = await asyncio.gather(
+            asyncio.gather(*(listing() for _ in range(args.listings))),
+            asyncio.gather(*(lookups(worker) for worker in range(args.clients))),
+        )
+        lookup_latencies = [latency for chunk in lookup_latencies for latency in chunk]
+        elapsed = time.perf_counter() - start
+
+    return [
+        summarize("listing", listing_latencies, elapsed),
+        summarize("tracking", lookup_latencies, elapsed),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--orders", type=int, default=3000)
+    parser.add_argument("--listings", type=int, default=20)
+    parser.add_argument("--lookups", type=int, default=400)
+    parser.add_argument(
+        "--clients", type=int, default=8, help="concurrent tracking clients"
+    )
+    parser.add_argument(
+        "--rate", type=float, default=40, help="tracking lookups per second"
+    )
+    parser.add_argument(
+        "--query-latency-ms",
+        type=float,
+        default=2,
+        help="time each statement waits, as on a round trip to a database server",
+    )
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        configure(
+            DATABASE_MODE="sync" if args.mode == "blocking" else args.mode,
+            # Every lookup goes to the database
+            TRACKING_CACHE_TTL=0,
+        )
+        print(json.dumps(asyncio.run(run(args))))
+        return
+
+    for mode in MODES:
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.concurrent_load", "--mode", mode]
+            + [
+                f"--{name.replace('_', '-')}={getattr(args, name)}"
+                for name in (
+                    "orders",
+                    "listings",
+                    "lookups",
+                    "clients",
+                    "rate",
+                    "query_latency_ms",
+                )
+            ],
+            check=True,
+            capture_output=True,
+            text=True,
+            env=os.environ.copy(),
+        ).stdout
+        for line in json.loads(output.strip().splitlines()[-1]):
+            print(
+                f"{mode:>8} {line['name']:<9} {line['requests']:>5} req  "
+                f"{line['throughput']:>8} req/s  p50 {line['p50_ms']:>8} ms  "
+                f"p99 {line['p99_ms']:>8} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# benchmarks/group_commit.py
+"""
+Sustained write throughput with WRITE_MODE=direct (a transaction per request)
+against WRITE_MODE=group (the group-commit writer, see writer.py). Concurrent
+clients send webhooks, status PATCHes and product assembly PATCHes; each mode
+runs in its own process on a fresh database.
+
+    python -m benchmarks.group_commit --orders 2000 --writes 2000 --clients 32
+    python -m benchmarks.group_commit --storage-profile sqlite-default
+    python -m benchmarks.group_commit --window-ms 10 --max-batch 256
+"""
+
+import argparse
+import itertools
+import random
+
+from benchmarks.common import (
+    compare,
+    configure,
+    print_report,
+    run_load,
+    tilda_payload,
+)
+
+MODES = ["direct", "group"]
+
+
+def write_requests(args, rng):
+    """Webhooks, status PATCHes and assembly PATCHes, 5:3:2, as operations."""
+    kinds = rng.choices(
+        ["webhook", "status", "assemble"], weights=[5, 3, 2], k=args.writes
+    )
+    webhook_ids = itertools.count(10**7)
+
+    def make_request(order_ids, headers):
+        async def request(client, kind, value):
+            if kind == "webhook":
+                return await client.post(
+                    "/tilda/orders/", json=tilda_payload(next(webhook_ids), 3, rng)
+                )
+            if kind == "status":
+                return await client.patch(
+                    f"/orders/{rng.choice(order_ids)}",
+                    params={
+                        "status": rng.choice(["processing", "shipped", "delivered"])
+                    },
+                    headers=headers,
+                )
+            return await client.patch(
+                f"/products/{rng.randint(1, args.orders * 3)}",
+                params={"assemble": rng.random() < 0.5},
+                headers=headers,
+            )
+
+        return request
+
+    return [(kind, None) for kind in kinds], make_request
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--writes", type=int, default=2000)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--storage-profile", default="sqlite")
+    parser.add_argument("--window-ms", type=float, help="GROUP_COMMIT_WINDOW_MS")
+    parser.add_argument("--max-batch", type=int, help="GROUP_COMMIT_MAX_BATCH")
+    parser.add_argument("--mode", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        settings = dict(
+            GROUP_COMMIT_WINDOW_MS=args.window_ms, GROUP_COMMIT_MAX_BATCH=args.max_batch
+        )
+        configure(
+            WRITE_MODE=args.mode,
+            DATABASE_PROFILE=args.storage_profile,
+            TRACKING_CACHE_TTL=0,
+            **{name: value for name, value in settings.items() if value is not None},
+        )
+        operations, make_request = write_requests(args, random.Random(0))
+        print_report(run_load(args.orders, operations, args.clients, make_request))
+        return
+
+    compare(
+        "benchmarks.group_commit",
+        "mode",
+        MODES,
+        args,
+        ["orders", "writes", "clients", "storage_profile", "window_ms", "max_batch"],
+    )
+
+
+if __name__ == "__main__":
+    main()
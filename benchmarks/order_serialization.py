@@ -0,0 +1,148 @@
+# benchmarks/order_serialization.py
+"""
+Time per 1,000 orders of the two ways to answer GET /orders/: ORM objects
+validated through OrderSchema and encoded by FastAPI, against row tuples
+rendered by order_json.render_orders; and of the GET /orders/summary view.
+Every page of every filter combination is also checked to come out
+byte-identical to what FastAPI renders through the route's response model.
+
+    python -m benchmarks.order_serialization --orders 10000 --page-size 1000
+"""
+
+import argparse
+import asyncio
+import time
+
+from benchmarks.common import configure
+
+
+def fastapi_body(path, objects):
+    """The body FastAPI builds from objects through the GET route's response_model."""
+    from fastapi.responses import JSONResponse
+    from fastapi.routing import serialize_response
+
+    import main
+
+    route = next(
+        route
+        for route in main.app.routes
+        if getattr(route, "path", None) == path and "GET" in route.methods
+    )
+    content = asyncio.run(
+        serialize_response(
+            field=route.response_field, response_content=objects, is_coroutine=True
+        )
+    )
+    return JSONResponse(content).body
+
+
+def schema_body(session, query):
+    orders = session.scalars(query).all()
+    loaded = time.perf_counter()
+    return fastapi_body("/orders/", orders), len(orders), loaded
+
+
+def rows_body(session, query):
+    from order_json import load_products, render_orders
+
+    rows = session.execute(query).all()
+    products = load_products(session, [row.order_id for row in rows])
+    loaded = time.perf_counter()
+    return render_orders(rows, products), len(rows), loaded
+
+
+def summary_body(session, query):
+    from order_json import render_summaries
+
+    rows = session.execute(query).all()
+    loaded = time.perf_counter()
+    return render_summaries(rows), len(rows), loaded
+
+
+def pages(filters, page_size):
+    """(ORM, row, summary) queries for every page of one filter combination."""
+    from sqlalchemy import select
+    from sqlalchemy.orm import joinedload, selectinload
+
+    from database import SessionLocal
+    from models import Order, Product
+    from order_json import order_rows_query, order_summary_query
+    from queries import encode_cursor, filter_orders, paginate_orders
+
+    cursor = None
+    with SessionLocal() as session:
+        while True:
+            orm_query = select(Order).options(
+                joinedload(Order.customer),
+                selectinload(Order.products).selectinload(Product.options),
+            )
+            queries = [
+                paginate_orders(filter_orders(query, **filters), cursor, page_size)
+                # paginate_orders adds a lookahead row; keep exactly one page
+                .limit(page_size)
+                for query in (orm_query, order_rows_query(), order_summary_query())
+            ]
+            keys = session.execute(queries[1]).all()
+            if not keys:
+                return
+            yield queries
+            cursor = encode_cursor(keys[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--orders", type=int, default=10000)
+    parser.add_argument("--products", type=int, default=3)
+    parser.add_argument("--page-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    configure()
+    from benchmarks.common import filter_combinations, seed
+    from database import SessionLocal
+
+    seed(args.orders, args.products)
+
+    # Orders, bytes, load and serialize seconds per path
+    totals = {name: [0, 0, 0.0, 0.0] for name in ("schema", "rows", "summary")}
+    mismatches = 0
+    for filters in filter_combinations():
+        for orm_query, row_query, summary_query in pages(filters, args.page_size):
+            bodies = {}
+            for name, build, query in (
+                ("schema", schema_body, orm_query),
+                ("rows", rows_body, row_query),
+                ("summary", summary_body, summary_query),
+            ):
+                # A fresh session each time, so neither path reuses the
+                # other's identity map
+                with SessionLocal() as session:
+                    start = time.perf_counter()
+                    bodies[name], count, loaded = build(session, query)
+                    end = time.perf_counter()
+                totals[name][0] += count
+                totals[name][1] += len(bodies[name])
+                totals[name][2] += loaded - start
+                totals[name][3] += end - loaded
+            if bodies["schema"] != bodies["rows"]:
+                mismatches += 1
+            with SessionLocal() as session:
+                rows = session.execute(summary_query).all()
+            if fastapi_body("/orders/summary", rows) != bodies["summary"]:
+                mismatches += 1
+
+    for name, (count, size, load, serialize) in totals.items():
+        per_thousand = 1000 / count if count else 0
+        print(
+            f"{name:>7}: {count} orders  per 1,000 orders: "
+            f"{size * per_thousand / 1024:7.1f} KiB  "
+            f"load {load * per_thousand * 1000:7.1f} ms  "
+            f"serialize {serialize * per_thousand * 1000:7.1f} ms  "
+            f"total {(load + serialize) * per_thousand * 1000:7.1f} ms"
+        )
+    print("byte-identical" if not mismatches else f"{mismatches} pages differ")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
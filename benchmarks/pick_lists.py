@@ -0,0 +1,74 @@
+# benchmarks/pick_lists.py
+"""
+Time a full pick-list cycle (load, render every class, zip) for one
+shipping date across all schools, inline and on the process pool (whatever
+PICKLIST_POOL_MIN_LINES says), to place that threshold.
+
+    python -m benchmarks.pick_lists --orders 20000 --workers 4
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.common import configure
+
+
+def run_inline(shipping_date):
+    """Every class rendered in this process, one after the other."""
+    from picklists import load_classes, write_class, zip_files
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = []
+        for pick_class in load_classes(shipping_date):
+            paths += write_class(directory, *pick_class)
+        return len(zip_files(paths)), len(paths)
+
+
+def run_pool(shipping_date):
+    from picklists import generate_pick_lists, zip_files
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = generate_pick_lists(directory, shipping_date)
+        return len(zip_files(paths)), len(paths)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--orders", type=int, default=20000)
+    parser.add_argument("--products", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--shipping-date", default="closest")
+    args = parser.parse_args()
+
+    configure(PICKLIST_WORKERS=args.workers, PICKLIST_POOL_MIN_LINES=0)
+    from benchmarks.common import seed
+    from picklists import _get_executor, load_classes, shutdown_pool, write_classes
+
+    seed(args.orders, args.products)
+    # Spawn every worker and have it import picklists outside the timed runs,
+    # as the workers of a running app would have after their first task
+    with tempfile.TemporaryDirectory() as directory:
+        list(
+            _get_executor().map(
+                write_classes, [directory] * args.workers, [[]] * args.workers
+            )
+        )
+
+    lines = sum(len(pick_class[3]) for pick_class in load_classes(args.shipping_date))
+    print(f"{lines} product lines")
+    try:
+        for name, run in (("inline", run_inline), ("pool", run_pool)):
+            start = time.perf_counter()
+            size, files = run(args.shipping_date)
+            elapsed = time.perf_counter() - start
+            print(
+                f"{name:>6}: {files} files, {size / 1024:.0f} KiB zip in {elapsed:.2f}s"
+            )
+    finally:
+        shutdown_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# benchmarks/search.py
+"""
+Latency of GET /orders/search queries (names, phone fragments, emails, order
+ids, SKUs) against the full-text index, plus the time to rebuild the index
+from scratch.
+
+    python -m benchmarks.search --orders 100000 --queries 200
+"""
+
+import argparse
+import random
+import time
+
+from benchmarks.common import configure
+
+
+def queries(order_ids, rng, count):
+    """Search strings of each kind staff type, drawn from the seeded data."""
+    from benchmarks.common import PRODUCTS
+
+    kinds = {
+        "name": lambda: f"Parent {rng.randrange(len(order_ids))}",
+        "phone": lambda: f"707 {rng.randint(0, 9999999):07d}"[: rng.randint(7, 11)],
+        "email": lambda: f"parent{rng.randrange(len(order_ids))}@example",
+        "order_id": lambda: rng.choice(order_ids),
+        "sku": lambda: rng.choice(PRODUCTS)[1].lower(),
+    }
+    return {name: [make() for _ in range(count)] for name, make in kinds.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--orders", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=200, help="per kind")
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    configure()
+    from benchmarks.common import percentile, seed
+    from database import SessionLocal
+    from search import rebuild_search_index, search_orders
+
+    order_ids = seed(args.orders)
+    start = time.perf_counter()
+    rebuild_search_index()
+    print(f"rebuild: {args.orders} orders in {time.perf_counter() - start:.2f}s")
+
+    rng = random.Random(0)
+    with SessionLocal() as session:
+        for kind, strings in queries(order_ids, rng, args.queries).items():
+            latencies, found = [], 0
+            for q in strings:
+                start = time.perf_counter()
+                found += bool(search_orders(session, q, args.limit))
+                latencies.append(time.perf_counter() - start)
+            print(
+                f"{kind:>8}: {len(strings)} queries, {found} with results  "
+                f"p50 {percentile(latencies, 50) * 1000:6.2f} ms  "
+                f"p99 {percentile(latencies, 99) * 1000:6.2f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+# benchmarks/smtp_delivery.py
+"""
+Email delivery throughput against a local stand-in SMTP server, comparing a
+new FastMail connection per message with the pooled Mailer.
+
+    python -m benchmarks.smtp_delivery --messages 300 --handshake-ms 30
+"""
+
+import argparse
+import asyncio
+import time
+
+
+class StandInSMTPServer:
+    """
+    Just enough SMTP to accept mail. Each new connection waits handshake_ms
+    before its greeting to stand in for the TCP + TLS setup of a real relay.
+    """
+
+    def __init__(self, handshake_ms: float):
+        self.handshake = handshake_ms / 1000
+        self.connections = 0
+        self.messages = 0
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        await asyncio.sleep(self.handshake)
+        writer.write(b"220 stand-in ESMTP\r\n")
+        try:
+            while line := await reader.readline():
+                command = line[:4].upper()
+                if command in (b"EHLO", b"HELO"):
+                    writer.write(b"250-stand-in\r\n250 8BITMIME\r\n")
+                elif command == b"DATA":
+                    writer.write(b"354 go ahead\r\n")
+                    await writer.drain()
+                    while (await reader.readline()) not in (b".\r\n", b""):
+                        pass
+                    self.messages += 1
+                    writer.write(b"250 queued\r\n")
+                elif command == b"QUIT":
+                    writer.write(b"221 bye\r\n")
+                    await writer.drain()
+                    break
+                else:
+                    writer.write(b"250 ok\r\n")
+                await writer.drain()
+        finally:
+            writer.close()
+
+
+def message(i):
+    from fastapi_mail import MessageSchema
+
+    return MessageSchema(
+        subject="Order Status Update",
+        recipients=[f"parent{i}@example.com"],
+        body=f"Your order with ID {100000 + i} has been updated to status: shipped",
+        subtype="html",
+    )
+
+
+async def run(args):
+    from fastapi_mail import ConnectionConfig, FastMail
+
+    from mailer import Mailer
+
+    server = StandInSMTPServer(args.handshake_ms)
+    smtp = await asyncio.start_server(server.handle, "127.0.0.1", 0)
+    port = smtp.sockets[0].getsockname()[1]
+    conf = ConnectionConfig(
+        MAIL_USERNAME="benchmark",
+        MAIL_PASSWORD="benchmark",
+        MAIL_FROM="shop@example.com",
+        MAIL_PORT=port,
+        MAIL_SERVER="127.0.0.1",
+        MAIL_STARTTLS=False,
+        MAIL_SSL_TLS=False,
+        USE_CREDENTIALS=False,
+        VALIDATE_CERTS=False,
+    )
+    messages = [message(i) for i in range(args.messages)]
+
+    # Before: a FastMail per message, each sent as its own background task
+    fm = FastMail(conf)
+    start = time.perf_counter()
+    for m in messages:
+        await fm.send_message(m)
+    per_message = time.perf_counter() - start
+    per_message_connections = server.connections
+
+    mailer = Mailer(conf, pool_size=args.pool_size)
+    start = time.perf_counter()
+    mailer.send_many(messages)
+    await mailer.queue.join()
+    pooled = time.perf_counter() - start
+    await mailer.stop()
+    pooled_connections = server.connections - per_message_connections
+
+    smtp.close()
+    for name, elapsed, connections in (
+        ("connection per message", per_message, per_message_connections),
+        (f"pooled ({args.pool_size} connections)", pooled, pooled_connections),
+    ):
+        print(
+            f"{name:<26} {len(messages) / elapsed:>8.1f} emails/s  "
+            f"{connections:>5} connections"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=300)
+    parser.add_argument("--handshake-ms", type=float, default=30)
+    parser.add_argument("--pool-size", type=int, default=2)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
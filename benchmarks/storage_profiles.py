@@ -0,0 +1,89 @@
+# benchmarks/storage_profiles.py
+"""
+Mixed read/write throughput per storage profile (see DATABASE_PROFILE in
+database.py). Each profile runs in its own process on a fresh database;
+the server profile runs only when --server-url points at a scratch database.
+
+    python -m benchmarks.storage_profiles --orders 3000 --operations 2000 --clients 16
+    python -m benchmarks.storage_profiles --server-url postgresql://bench@localhost/bench
+"""
+
+import argparse
+import itertools
+import os
+import random
+
+from benchmarks.common import (
+    compare,
+    configure,
+    print_report,
+    run_load,
+    tilda_payload,
+)
+
+PROFILES = ["sqlite-default", "sqlite"]
+
+
+def mixed_requests(args, rng):
+    """Reads and writes in --write-ratio proportion, as (kind, value) operations."""
+    operations = [
+        ("write" if rng.random() < args.write_ratio else "read", rng.random())
+        for _ in range(args.operations)
+    ]
+    webhook_ids = itertools.count(10**7)
+
+    def make_request(order_ids, headers):
+        async def request(client, kind, choice):
+            if kind == "write" and choice < 0.5:
+                return await client.post(
+                    "/tilda/orders/", json=tilda_payload(next(webhook_ids), 3, rng)
+                )
+            if kind == "write":
+                return await client.patch(
+                    f"/orders/{rng.choice(order_ids)}",
+                    params={"status": rng.choice(["processing", "shipped"])},
+                    headers=headers,
+                )
+            if choice < 0.5:
+                return await client.get(
+                    "/orders/",
+                    params={"shipping_date": "closest", "limit": 50},
+                    headers=headers,
+                )
+            return await client.get(f"/order-tracking/{rng.choice(order_ids)}")
+
+        return request
+
+    return operations, make_request
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--orders", type=int, default=3000)
+    parser.add_argument("--operations", type=int, default=2000)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--write-ratio", type=float, default=0.3)
+    parser.add_argument("--server-url", help="scratch server database for 'server'")
+    parser.add_argument("--profile", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.profile:
+        # Reads must reach the database rather than the tracking cache
+        configure(DATABASE_PROFILE=args.profile, TRACKING_CACHE_TTL=0)
+        if args.profile == "server":
+            os.environ["DATABASE_URL"] = args.server_url
+        operations, make_request = mixed_requests(args, random.Random(0))
+        print_report(run_load(args.orders, operations, args.clients, make_request))
+        return
+
+    compare(
+        "benchmarks.storage_profiles",
+        "profile",
+        PROFILES + (["server"] if args.server_url else []),
+        args,
+        ["orders", "operations", "clients", "write_ratio", "server_url"],
+    )
+
+
+if __name__ == "__main__":
+    main()
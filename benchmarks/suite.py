@@ -0,0 +1,288 @@
+# benchmarks/suite.py
+"""
+End-to-end benchmark of the main flows, driving the ASGI app in-process on a
+freshly seeded season: Tilda webhook, every GET /orders/ filter combination,
+tracking, status PATCH and login. Reports throughput and p50/p99 per flow and
+can save the results as a baseline or compare them against one.
+
+    python -m benchmarks.suite --orders 5000 --save-baseline baseline.json
+    python -m benchmarks.suite --orders 5000 --baseline baseline.json
+"""
+
+import argparse
+import asyncio
+import contextlib
+import itertools
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+from benchmarks.common import configure
+
+
+async def drive(name, requests, clients):
+    """Send the request coroutine factories through `clients` concurrent workers."""
+    from benchmarks.common import summarize, timed
+
+    pending = iter(requests)
+    latencies = []
+
+    async def worker():
+        for request in pending:
+            latencies.append(await timed(request()))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(clients)))
+    return summarize(name, latencies, time.perf_counter() - start)
+
+
+async def current_statuses(order_ids):
+    from sqlalchemy import select
+
+    from database import open_session
+    from models import Order
+
+    db = open_session()
+    try:
+        rows = await db.execute(
+            select(Order.order_id, Order.status).where(Order.order_id.in_(order_ids))
+        )
+        return {order_id: status.value for order_id, status in rows}
+    finally:
+        await db.close()
+
+
+async def run(args):
+    from benchmarks.common import auth_headers, filter_combinations, seed, tilda_payload
+
+    order_ids = seed(
+        orders=args.orders,
+        products_per_order=args.products,
+        seed_value=args.seed,
+        shipping_dates=args.shipping_dates,
+    )
+
+    import httpx
+    import main
+
+    # Notifications still go through the mailer's queue, but no SMTP server
+    # is contacted
+    main.mailer.config.SUPPRESS_SEND = 1
+
+    rng = random.Random(args.seed)
+    headers = auth_headers()
+    results = []
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+
+        webhook_ids = itertools.count(10**7)
+        results.append(
+            await drive(
+                "webhook",
+                [
+                    lambda: client.post(
+                        "/tilda/orders/",
+                        json=tilda_payload(next(webhook_ids), args.products, rng),
+                    )
+                    for _ in range(args.requests)
+                ],
+                args.clients,
+            )
+        )
+
+        for filters in filter_combinations():
+            params = {key: value for key, value in filters.items() if value is not None}
+            name = ",".join(f"{key}={value}" for key, value in params.items())
+            results.append(
+                await drive(
+                    f"orders[{name}]",
+                    [
+                        lambda params=params: client.get(
+                            "/orders/", params=params, headers=headers
+                        )
+                        for _ in range(args.listings)
+                    ],
+                    args.clients,
+                )
+            )
+
+        results.append(
+            await drive(
+                "tracking",
+                [
+                    lambda order_id=rng.choice(order_ids): client.get(
+                        f"/order-tracking/{order_id}"
+                    )
+                    for _ in range(args.requests)
+                ],
+                args.clients,
+            )
+        )
+
+        # Each order is patched once, to a status it does not have yet, so no
+        # PATCH is rejected as a no-op
+        current = await current_statuses(
+            rng.sample(order_ids, min(args.requests, len(order_ids)))
+        )
+        results.append(
+            await drive(
+                "status_patch",
+                [
+                    lambda order_id=order_id, status=status: client.patch(
+                        f"/orders/{order_id}",
+                        params={
+                            "status": "delivered" if status == "shipped" else "shipped"
+                        },
+                        headers=headers,
+                    )
+                    for order_id, status in current.items()
+                ],
+                args.clients,
+            )
+        )
+
+        # bcrypt runs on a small bounded pool; stay within its queue
+        results.append(
+            await drive(
+                "login",
+                [
+                    lambda: client.post(
+                        "/token", data={"username": "staff", "password": "staff"}
+                    )
+                    for _ in range(args.logins)
+                ],
+                min(args.clients, 4),
+            )
+        )
+
+    await main.mailer.stop()
+    return results
+
+
+def summarize_listings(results):
+    """One extra line aggregating every filter combination of GET /orders/."""
+    listings = [line for line in results if line["name"].startswith("orders[")]
+    requests = sum(line["requests"] for line in listings)
+    elapsed = sum(line["requests"] / line["throughput"] for line in listings)
+    return {
+        "name": "orders[all filters]",
+        "requests": requests,
+        "throughput": round(requests / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": sorted(line["p50_ms"] for line in listings)[len(listings) // 2],
+        "p99_ms": max(line["p99_ms"] for line in listings),
+    }
+
+
+def is_listed(line, verbose):
+    """Single filter combinations are only printed with --verbose."""
+    return (
+        verbose
+        or not line["name"].startswith("orders[")
+        or line["name"] == "orders[all filters]"
+    )
+
+
+def compare(results, baseline, tolerance, verbose=False):
+    """
+    Print each flow's change against the baseline and return the flows that
+    regressed: throughput down or p50 up by more than tolerance.
+    """
+    previous = {line["name"]: line for line in baseline["results"]}
+    regressions = []
+    for line in results:
+        base = previous.get(line["name"])
+        if base is None or not is_listed(line, verbose):
+            continue
+        throughput = line["throughput"] / base["throughput"] - 1
+        p50 = line["p50_ms"] / base["p50_ms"] - 1 if base["p50_ms"] else 0.0
+        regressed = throughput < -tolerance or p50 > tolerance
+        if regressed:
+            regressions.append(line["name"])
+        print(
+            f"{line['name']:<60} throughput {throughput:+7.1%}  p50 {p50:+7.1%}"
+            + ("  REGRESSION" if regressed else "")
+        )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--orders", type=int, default=5000)
+    parser.add_argument("--products", type=int, default=3)
+    parser.add_argument("--shipping-dates", type=int, default=9)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--requests", type=int, default=300, help="per webhook/tracking/PATCH flow"
+    )
+    parser.add_argument(
+        "--listings", type=int, default=5, help="per GET /orders/ filter combination"
+    )
+    parser.add_argument("--logins", type=int, default=20)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--save-baseline", help="write the results as a baseline")
+    parser.add_argument("--baseline", help="compare against this baseline file")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.15,
+        help="relative change counted as a regression",
+    )
+    parser.add_argument("--verbose", action="store_true", help="list every filter")
+    args = parser.parse_args()
+
+    configure()
+    # The handlers' own prints would bury the report
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        results = asyncio.run(run(args))
+    results.append(summarize_listings(results))
+
+    for line in results:
+        if not is_listed(line, args.verbose):
+            continue
+        print(
+            f"{line['name']:<60} {line['requests']:>5} req  "
+            f"{line['throughput']:>8} req/s  p50 {line['p50_ms']:>8} ms  "
+            f"p99 {line['p99_ms']:>8} ms"
+        )
+
+    report = {
+        "settings": {
+            key: getattr(args, key)
+            for key in (
+                "orders",
+                "products",
+                "shipping_dates",
+                "seed",
+                "requests",
+                "listings",
+                "logins",
+                "clients",
+            )
+        },
+        "python": platform.python_version(),
+        "results": results,
+    }
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline["settings"] != report["settings"]:
+            print("Warning: the baseline was recorded with different settings")
+        regressions = compare(results, baseline, args.tolerance, args.verbose)
+        if regressions:
+            print(f"{len(regressions)} flows regressed beyond {args.tolerance:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+# benchmarks/webhook_ingest.py
+"""
+Webhooks per second for the Tilda ingestion path, comparing the former
+commit-per-row persistence with the single-transaction build_order graph.
+
+    python -m benchmarks.webhook_ingest --webhooks 300 --products 5
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime
+
+from benchmarks.common import configure
+
+
+def legacy_ingest(db, customer_data):
+    """The pre-batching handler body: a commit and refresh per row."""
+    from models import Customer, Order, Product, ProductOption, StatusChange
+    from models import StatusEnum
+    from utils import get_next_shipping_day
+
+    customer = Customer(
+        name=customer_data["Name"],
+        phone=customer_data["Phone"],
+        email=customer_data["Email"],
+    )
+    db.add(customer)
+    db.commit()
+    db.refresh(customer)
+
+    payment_data = customer_data["payment"]
+    order = Order(
+        customer_id=customer.id,
+        order_id=payment_data["orderid"],
+        payment_system=customer_data["paymentsystem"],
+        total_amount=payment_data["amount"],
+        form_id=customer_data["formid"],
+        form_name=customer_data["formname"],
+        shipping_date=get_next_shipping_day(datetime.now()),
+        school=customer_data["school"],
+        grade=int(customer_data["grade"]),
+        letter=customer_data["letter"],
+    )
+    db.add(order)
+    db.add(StatusChange(order_id=order.order_id, status=StatusEnum.new))
+    db.commit()
+    db.refresh(order)
+
+    for product_data in payment_data["products"]:
+        product = Product(
+            order_id=order.order_id,
+            name=product_data["name"],
+            sku=product_data["sku"],
+            price=product_data["price"],
+            quantity=product_data["quantity"],
+            amount=product_data["amount"],
+        )
+        db.add(product)
+        db.commit()
+        db.refresh(product)
+        for option_data in product_data.get("options", []):
+            db.add(
+                ProductOption(
+                    product_id=product.id,
+                    option_name=option_data["option"],
+                    variant=option_data["variant"],
+                )
+            )
+    db.commit()
+
+
+def batched_ingest(db, customer_data):
+    from ingest import build_order, upsert_customer
+
+    order = build_order(customer_data)
+    order.customer_id = upsert_customer(db, customer_data)
+    db.add(order)
+    db.commit()
+
+
+def measure(ingest, payloads):
+    from benchmarks.common import seed
+    from database import SessionLocal
+
+    seed(orders=0)
+    db = SessionLocal()
+    try:
+        start = time.perf_counter()
+        for payload in payloads:
+            ingest(db, payload)
+        return len(payloads) / (time.perf_counter() - start)
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--webhooks", type=int, default=300)
+    parser.add_argument("--products", type=int, default=5)
+    args = parser.parse_args()
+
+    configure()
+    from benchmarks.common import tilda_payload
+
+    rng = random.Random(0)
+    payloads = [
+        tilda_payload(500000 + i, products=args.products, rng=rng)
+        for i in range(args.webhooks)
+    ]
+    for name, ingest in (
+        ("commit per row", legacy_ingest),
+        ("one transaction", batched_ingest),
+    ):
+        print(f"{name:<16} {measure(ingest, payloads):>8.1f} webhooks/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+# bulk.py
+from sqlalchemy import case, func, insert, select, update
+
+from models import Customer, Order, Product, StatusChange, StatusEnum
+from queries import filter_orders
+
+# Keeps each IN (...) list well under SQLite's bound parameter limit
+BULK_CHUNK_SIZE = 500
+
+
+def chunked(items, size: int = BULK_CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+def transition_orders(
+    session,
+    status: StatusEnum,
+    order_ids: list = None,
+    filters: dict = None,
+    from_status: StatusEnum = None,
+):
+    """
+    Move the selected orders to status in one transaction: one SELECT of the
+    current states, one UPDATE and one multi-row INSERT of StatusChange rows
+    per chunk of orders, then a single commit.
+    Orders are selected by order_ids or, if None, by the filter_orders filters.
+    Returns the per-order outcomes and the rows of the orders that changed
+    (order_id, status, email and the order's class), to notify.
+    """
+    # Without UPDATE ... RETURNING (MySQL) the rows are locked as they are
+    # read, so the UPDATE changes exactly the orders found eligible here
+    returning = session.get_bind().dialect.update_returning
+    query = select(
+        Order.order_id,
+        Order.status,
+        Customer.email,
+        Order.shipping_date,
+        Order.school,
+        Order.grade,
+        Order.letter,
+    ).outerjoin(Order.customer)
+    if not returning:
+        query = query.with_for_update(of=Order)
+    if order_ids is None:
+        rows = session.execute(filter_orders(query, **filters)).all()
+    else:
+        rows = []
+        for chunk in chunked(order_ids):
+            rows += session.execute(query.where(Order.order_id.in_(chunk))).all()
+
+    current = {row.order_id: row for row in rows}
+    if order_ids is None:
+        order_ids = sorted(current)
+
+    results = []
+    eligible = []
+    for order_id in dict.fromkeys(order_ids):
+        if order_id not in current:
+            results.append({"order_id": order_id, "outcome": "not_found"})
+            continue
+        previous = current[order_id].status
+        if previous == status:
+            outcome = "unchanged"
+        elif from_status is not None and previous != from_status:
+            outcome = "skipped"
+        else:
+            outcome = "updated"
+            eligible.append(order_id)
+        results.append(
+            {"order_id": order_id, "outcome": outcome, "previous_status": previous}
+        )
+
+    # The UPDATE checks the state again, so a status written by a concurrent
+    # request since the SELECT is neither overwritten nor logged twice
+    condition = Order.status != status
+    if from_status is not None:
+        condition = Order.status == from_status
+    updated = set()
+    for chunk in chunked(eligible):
+        statement = update(Order).where(Order.order_id.in_(chunk), condition)
+        statement = statement.values(status=status)
+        if returning:
+            updated.update(session.scalars(statement.returning(Order.order_id)).all())
+        else:
+            session.execute(statement)
+            updated.update(chunk)
+    for chunk in chunked(sorted(updated)):
+        session.execute(
+            insert(StatusChange),
+            [{"order_id": order_id, "status": status} for order_id in chunk],
+        )
+    session.commit()
+
+    for result in results:
+        if result["outcome"] == "updated" and result["order_id"] not in updated:
+            # Changed by another request between the SELECT and the UPDATE
+            result["outcome"] = "skipped"
+    return results, [current[order_id] for order_id in eligible if order_id in updated]
+
+
+def assemble_products(
+    session,
+    assemble: bool,
+    product_ids: list = None,
+    order_ids: list = None,
+    filters: dict = None,
+):
+    """
+    Set is_assembled on the selected products, with one UPDATE per chunk of
+    product_ids or order_ids (a single one for filters).
+    Products are selected by product_ids, by the orders in order_ids or by
+    the orders matching the filter_orders filters (e.g. a whole class).
+    Returns the number of products updated and, for every order touched, a
+    row with its class and how many of its products are assembled (assembled,
+    total), from one grouped SELECT per chunk of orders.
+    """
+    # Deduplicated, so an id repeated across chunks is not counted twice
+    if product_ids is not None:
+        product_ids = list(dict.fromkeys(product_ids))
+        selections = [Product.id.in_(chunk) for chunk in chunked(product_ids)]
+    elif order_ids is not None:
+        order_ids = list(dict.fromkeys(order_ids))
+        selections = [Product.order_id.in_(chunk) for chunk in chunked(order_ids)]
+    else:
+        selections = [
+            Product.order_id.in_(filter_orders(select(Order.order_id), **filters))
+        ]
+
+    updated = 0
+    # Orders of the selected products, for the counts below
+    touched = set(order_ids or ())
+    for selection in selections:
+        updated += session.execute(
+            update(Product)
+            .where(selection)
+            .values(is_assembled=assemble)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if product_ids is not None:
+            touched.update(
+                session.scalars(select(Product.order_id).where(selection).distinct())
+            )
+
+    assembled = func.sum(case((Product.is_assembled == True, 1), else_=0))
+    query = (
+        select(
+            Order.order_id,
+            Order.shipping_date,
+            Order.school,
+            Order.grade,
+            Order.letter,
+            assembled.label("assembled"),
+            func.count(Product.id).label("total"),
+        )
+        .join(Order.products)
+        .group_by(Order.order_id)
+        .order_by(Order.order_id)
+    )
+    if product_ids is not None or order_ids is not None:
+        # Sorted chunks, so the rows stay in order_id order across them
+        counts = []
+        for chunk in chunked(sorted(touched)):
+            counts += session.execute(query.where(Order.order_id.in_(chunk))).all()
+    else:
+        counts = session.execute(
+            query.where(Order.order_id.in_(select(Product.order_id).where(*selections)))
+        ).all()
+    session.commit()
+
+    return updated, counts
@@ -0,0 +1,62 @@
+from collections import defaultdict
+
+from sqlalchemy import update
+
+from database import SessionLocal, create_schema
+from models import Base, Customer, Order
+from search import rebuild_search_index
+from utils import customer_contact_key
+
+db = SessionLocal()
+
+
+def compact_customers():
+    """
+    Merge customers sharing a normalized email/phone into the oldest row,
+    repoint their orders to it and backfill contact_key for the webhook upsert.
+    """
+    create_schema(Base.metadata)
+
+    groups = defaultdict(list)
+    for customer in db.query(Customer).order_by(Customer.id):
+        key = customer_contact_key(customer.email, customer.phone)
+        if key is None:
+            # No contact details to match on: kept as is, and cleared of the
+            # "|" key earlier versions gave them
+            customer.contact_key = None
+        else:
+            groups[key].append(customer)
+
+    merged = 0
+    for key, customers in groups.items():
+        survivor, duplicates = customers[0], customers[1:]
+        if duplicates:
+            latest = customers[-1]
+            db.execute(
+                update(Order)
+                .where(Order.customer_id.in_([c.id for c in duplicates]))
+                .values(customer_id=survivor.id)
+            )
+            for duplicate in duplicates:
+                db.delete(duplicate)
+            # Keep the most recent name and contact details
+            survivor.name, survivor.phone, survivor.email = (
+                latest.name,
+                latest.phone,
+                latest.email,
+            )
+            merged += len(duplicates)
+    # Remove the duplicates before any key is set so the unique index holds
+    db.flush()
+
+    for key, customers in groups.items():
+        customers[0].contact_key = key
+
+    db.commit()
+    # Merged customers' orders now carry the survivor's contact details
+    rebuild_search_index()
+    print(f"Merged {merged} duplicate customers into {len(groups)} customers.")
+
+
+if __name__ == "__main__":
+    compact_customers()
@@ -1,7 +1,8 @@
+import asyncio
 from sqlalchemy.orm import Session
 from database import SessionLocal
 from models import User
-from auth import get_password_hash
+from auth import get_password_hash_async
 
 db = SessionLocal()
 
@@ -13,7 +14,9 @@ def create_user(username: str, password: str):
         print(f"User with username {username} already exists.")
         return
 
-    user = User(username=username, hashed_password=get_password_hash(password))
+    # Hash on the same bounded pool the login endpoint uses
+    hashed_password = asyncio.run(get_password_hash_async(password))
+    user = User(username=username, hashed_password=hashed_password)
     db.add(user)
     db.commit()
     db.refresh(user)
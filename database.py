@@ -1,23 +1,312 @@
 # database.py
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.schema import CreateTable
 from sqlalchemy.orm import sessionmaker
+from starlette.concurrency import run_in_threadpool
 import os
+from dotenv import load_dotenv
+
+load_dotenv()
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-SQLALCHEMY_DATABASE_URL = f"sqlite:///{os.path.join(BASE_DIR, 'db', 'test.db')}"
+SQLALCHEMY_DATABASE_URL = os.getenv(
+    "DATABASE_URL", f"sqlite:///{os.path.join(BASE_DIR, 'db', 'test.db')}"
+)
+
+# "async" serves requests through an async driver, "sync" through the classic
+# driver with every call offloaded to the threadpool. Sync stays the default
+# while it measures better (python -m benchmarks.concurrent_load)
+DATABASE_MODE = os.getenv("DATABASE_MODE", "sync")
+
+# Async drivers used for each backend when DATABASE_URL names a sync one.
+# requirements.txt ships psycopg2/asyncpg and PyMySQL/aiomysql: use
+# postgresql:// or mysql+pymysql:// URLs
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+}
+
+
+def to_async_url(url: str) -> str:
+    scheme, rest = url.split("://", 1)
+    # "mysql+pymysql" and the like name the backend before the "+"
+    return f"{ASYNC_DRIVERS.get(scheme.split('+')[0], scheme)}://{rest}"
+
+
+ASYNC_SQLALCHEMY_DATABASE_URL = os.getenv(
+    "ASYNC_DATABASE_URL", to_async_url(SQLALCHEMY_DATABASE_URL)
+)
+
+connect_args = (
+    {"check_same_thread": False} if SQLALCHEMY_DATABASE_URL.startswith("sqlite") else {}
+)
+
+# Storage profile, picked from the URL unless set:
+# "sqlite"         - WAL journal and tuned pragmas on every connection
+# "sqlite-default" - SQLite as it comes (rollback journal, no tuning)
+# "server"         - a server database (PostgreSQL, MySQL) behind a sized pool
+#                    that pre-pings and recycles its connections
+DATABASE_PROFILE = os.getenv(
+    "DATABASE_PROFILE",
+    "sqlite" if SQLALCHEMY_DATABASE_URL.startswith("sqlite") else "server",
+)
+
+SQLITE_PRAGMAS = {
+    # Readers no longer block the writer and the writer no longer blocks readers
+    "journal_mode": "WAL",
+    # Durable at each checkpoint rather than each commit, the usual WAL pairing
+    "synchronous": "NORMAL",
+    # Wait for the write lock instead of failing with "database is locked"
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000)),
+    # Negative sizes are in KiB. Both last as long as the connection: the
+    # sync engine's pool keeps them, aiosqlite's connections only a request
+    "cache_size": -int(os.getenv("SQLITE_CACHE_KB", 65536)),
+    "mmap_size": int(os.getenv("SQLITE_MMAP_BYTES", 256 * 1024 * 1024)),
+    "temp_store": "MEMORY",
+}
+
+POOL_SETTINGS = {
+    "pool_size": int(os.getenv("DB_POOL_SIZE", 10)),
+    "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", 20)),
+    "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", 30)),
+    "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", 1800)),
+    "pool_pre_ping": True,
+}
+
+engine_options = POOL_SETTINGS if DATABASE_PROFILE == "server" else {}
+if DATABASE_PROFILE == "sqlite":
+    # The driver opens a transaction just before the first write, and with
+    # IMMEDIATE it waits for the write lock there; a deferred transaction
+    # would take a WAL snapshot first and fail with "database is locked",
+    # without waiting, whenever another writer committed in between
+    connect_args = {**connect_args, "isolation_level": "IMMEDIATE"}
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name} = {value}")
+    cursor.close()
+
+
+def _add_sqlite_functions(dbapi_connection, connection_record):
+    # SQLite's lower() and case-insensitive LIKE only fold ASCII letters
+    dbapi_connection.create_function(
+        "unicode_lower", 1, lambda value: value and value.lower(), deterministic=True
+    )
+
+
+def apply_profile(sync_engine):
+    """Install the connection setup of DATABASE_PROFILE on an engine."""
+    if DATABASE_PROFILE == "sqlite":
+        event.listen(sync_engine, "connect", _apply_sqlite_pragmas)
+    if sync_engine.dialect.name == "sqlite":
+        event.listen(sync_engine, "connect", _add_sqlite_functions)
+
 
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+    SQLALCHEMY_DATABASE_URL, connect_args=connect_args, **engine_options
 )
+apply_profile(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
 
+def _python_type(column_type):
+    try:
+        return column_type.python_type
+    except NotImplementedError:
+        return None
+
+
+def _retype_column(connection, table, column):
+    """Convert an existing column, and the values in it, to its declared type."""
+    quote = engine.dialect.identifier_preparer.quote
+    name, column_type = quote(column.name), column.type.compile(dialect=engine.dialect)
+    if engine.dialect.name == "postgresql":
+        connection.execute(
+            text(
+                f"ALTER TABLE {quote(table.name)} ALTER COLUMN {name} "
+                f"TYPE {column_type} USING {name}::{column_type}"
+            )
+        )
+    elif engine.dialect.name == "mysql":
+        connection.execute(
+            text(f"ALTER TABLE {quote(table.name)} MODIFY {name} {column_type}")
+        )
+    else:
+        # SQLite cannot alter a column: copy the rows into a new table of the
+        # declared shape and swap it in; create_schema recreates the indexes
+        existing = [c["name"] for c in inspect(connection).get_columns(table.name)]
+        copy = table.to_metadata(table.metadata, name=f"_new_{table.name}")
+        try:
+            connection.execute(CreateTable(copy))
+        finally:
+            table.metadata.remove(copy)
+        values = [
+            f"CAST({quote(c)} AS {column_type})" if c == column.name else quote(c)
+            for c in existing
+        ]
+        connection.execute(
+            text(
+                f"INSERT INTO {quote(copy.name)} ({', '.join(map(quote, existing))}) "
+                f"SELECT {', '.join(values)} FROM {quote(table.name)}"
+            )
+        )
+        connection.execute(text(f"DROP TABLE {quote(table.name)}"))
+        connection.execute(
+            text(f"ALTER TABLE {quote(copy.name)} RENAME TO {quote(table.name)}")
+        )
+
+
+def create_schema(metadata):
+    """
+    Create missing tables, then bring existing ones up to date: foreign keys
+    stored with another type than the key they reference are converted, and
+    the columns and indexes declared since the tables were created are added.
+    """
+    metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        inspector = inspect(connection)
+        for table in metadata.sorted_tables:
+            stored = {c["name"]: c["type"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if (
+                    column.foreign_keys
+                    and column.name in stored
+                    and _python_type(stored[column.name]) != _python_type(column.type)
+                ):
+                    _retype_column(connection, table, column)
+    inspector = inspect(engine)
+    quote = engine.dialect.identifier_preparer.quote
+    with engine.begin() as connection:
+        for table in metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    connection.execute(
+                        text(
+                            f"ALTER TABLE {quote(table.name)} "
+                            f"ADD COLUMN {quote(column.name)} {column_type}"
+                        )
+                    )
+            for index in table.indexes:
+                index.create(bind=connection, checkfirst=True)
+
+
+def begin_write(session):
+    """
+    Open the session's transaction for writing, so SAVEPOINTs can be used in it.
+    """
+    # pysqlite only opens a transaction before the first INSERT, UPDATE or
+    # DELETE: a SAVEPOINT ahead of that would open one of its own, and
+    # releasing it would commit everything so far
+    connection = session.connection()
+    if connection.dialect.name == "sqlite":
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+# Only built in async mode, so sync mode needs no async driver
+async_engine = AsyncSessionLocal = None
+if DATABASE_MODE == "async":
+    async_engine_options = dict(engine_options)
+    if DATABASE_PROFILE == "sqlite":
+        # aiosqlite keeps its default of a connection per checkout, so
+        # cache_size and mmap_size only last a request here (the OS page
+        # cache still holds the file); pooling its connections, bounded or
+        # not, made more writes fail waiting for the lock
+        async_engine_options["connect_args"] = {"isolation_level": "IMMEDIATE"}
+    async_engine = create_async_engine(
+        ASYNC_SQLALCHEMY_DATABASE_URL, **async_engine_options
+    )
+    apply_profile(async_engine.sync_engine)
+    AsyncSessionLocal = async_sessionmaker(
+        async_engine, autoflush=False, expire_on_commit=False
+    )
+
+# Request sessions keep loaded state after commit in both modes, so responses
+# never lazy-load once the handler is done
+ThreadedSessionLocal = sessionmaker(
+    autocommit=False, autoflush=False, expire_on_commit=False, bind=engine
+)
+
+
+class ThreadedSession:
+    """
+    The subset of the AsyncSession API used by the handlers, backed by a sync
+    Session whose blocking calls run in the threadpool.
+    """
+
+    def __init__(self, session):
+        self.sync_session = session
+
+    def add(self, instance):
+        self.sync_session.add(instance)
+
+    def add_all(self, instances):
+        self.sync_session.add_all(instances)
+
+    def expunge(self, instance):
+        self.sync_session.expunge(instance)
+
+    def expunge_all(self):
+        self.sync_session.expunge_all()
+
+    async def execute(self, statement, *args, **kwargs):
+        # Buffer the rows in the worker thread so iterating the result does no I/O
+        def execute():
+            return self.sync_session.execute(statement, *args, **kwargs).freeze()
+
+        return (await run_in_threadpool(execute))()
+
+    async def scalar(self, statement, *args, **kwargs):
+        return await run_in_threadpool(
+            self.sync_session.scalar, statement, *args, **kwargs
+        )
+
+    async def scalars(self, statement, *args, **kwargs):
+        return (await self.execute(statement, *args, **kwargs)).scalars()
+
+    async def get(self, entity, ident, **kwargs):
+        return await run_in_threadpool(self.sync_session.get, entity, ident, **kwargs)
+
+    async def delete(self, instance):
+        await run_in_threadpool(self.sync_session.delete, instance)
+
+    async def refresh(self, instance, attribute_names=None):
+        await run_in_threadpool(self.sync_session.refresh, instance, attribute_names)
+
+    async def flush(self, objects=None):
+        await run_in_threadpool(self.sync_session.flush, objects)
+
+    async def commit(self):
+        await run_in_threadpool(self.sync_session.commit)
+
+    async def rollback(self):
+        await run_in_threadpool(self.sync_session.rollback)
+
+    async def close(self):
+        await run_in_threadpool(self.sync_session.close)
+
+    async def run_sync(self, fn, *args, **kwargs):
+        return await run_in_threadpool(fn, self.sync_session, *args, **kwargs)
+
+
+def open_session():
+    """A request session for the configured DATABASE_MODE; close it with await db.close()."""
+    if DATABASE_MODE == "sync":
+        return ThreadedSession(ThreadedSessionLocal())
+    return AsyncSessionLocal()
+
+
 # Dependency for getting the DB session
-def get_db():
-    db = SessionLocal()
+async def get_db():
+    db = open_session()
     try:
         yield db
     finally:
-        db.close()
+        await db.close()
@@ -0,0 +1,180 @@
+# events.py
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import date, datetime
+
+from utils import SCHOOLS, get_next_shipping_day
+
+# Events kept for clients resuming with Last-Event-ID
+EVENTS_BUFFER_SIZE = int(os.getenv("EVENTS_BUFFER_SIZE", 1000))
+# Events a slow subscriber may fall behind by before it is told to reload
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", 500))
+EVENTS_HEARTBEAT = float(os.getenv("EVENTS_HEARTBEAT", 15))
+
+# Event ids are "<epoch>-<sequence>"; a different epoch means the id was
+# issued before a restart and cannot be resumed from
+_epoch = str(int(time.time()))
+_sequence = 0
+_buffer = deque(maxlen=EVENTS_BUFFER_SIZE)
+_subscribers = set()
+_lock = threading.Lock()
+
+RESET = "reset"
+
+
+def order_fields(order) -> dict:
+    """The fields subscriptions are filtered on."""
+    shipping_date = order.shipping_date
+    if isinstance(shipping_date, datetime):
+        shipping_date = shipping_date.date()
+    return {
+        "order_id": str(order.order_id),
+        "shipping_date": shipping_date.isoformat() if shipping_date else None,
+        "school": order.school,
+        "grade": order.grade,
+        "letter": order.letter,
+    }
+
+
+def publish(event_type: str, **data):
+    """
+    Record a committed change and push it to every subscriber.
+    Safe to call from the event loop and from threadpool workers.
+    """
+    global _sequence
+    with _lock:
+        _sequence += 1
+        event = {"id": f"{_epoch}-{_sequence}", "type": event_type, **data}
+        _buffer.append(event)
+        subscribers = list(_subscribers)
+    for subscriber in subscribers:
+        subscriber.push(event)
+
+
+class Subscription:
+    """A client's queue of events, fed by publish() from any thread."""
+
+    def __init__(self, filters: dict):
+        self.filters = filters
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(EVENTS_QUEUE_SIZE)
+
+    def push(self, event):
+        if matches(event, self.filters):
+            try:
+                self.loop.call_soon_threadsafe(self._put, event)
+            except RuntimeError:
+                # The subscriber's loop has already closed
+                pass
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Too far behind to deliver every delta; have the client reload
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"type": RESET})
+
+
+def matches(event, filters: dict) -> bool:
+    """The GET /orders/ filters (see queries.filter_orders) applied to one event."""
+    if event["type"] == RESET:
+        return True
+    school = filters.get("school")
+    if school and event.get("school") != SCHOOLS.get(school):
+        return False
+    grade = filters.get("grade")
+    if grade and str(event.get("grade")) != str(grade):
+        return False
+    letter = filters.get("letter")
+    if letter and event.get("letter") != letter:
+        return False
+    shipping_date = filters.get("shipping_date")
+    if shipping_date and event.get("shipping_date"):
+        closest = get_next_shipping_day(datetime.now())
+        event_date = date.fromisoformat(event["shipping_date"])
+        if shipping_date == "closest":
+            return event_date == closest.date()
+        if shipping_date == "next":
+            return event_date == get_next_shipping_day(closest).date()
+        return event_date < closest.date()
+    return True
+
+
+def _missed_events(last_event_id: str, filters: dict):
+    """
+    Buffered events after last_event_id, or None when they cannot all be
+    replayed (issued before a restart or already dropped from the buffer).
+    """
+    try:
+        epoch, sequence = last_event_id.split("-")
+        sequence = int(sequence)
+    except ValueError:
+        return None
+    with _lock:
+        events = list(_buffer)
+        current = _sequence
+    if epoch != _epoch or sequence > current:
+        return None
+    oldest = int(events[0]["id"].split("-")[1]) if events else current + 1
+    if sequence + 1 < oldest:
+        return None
+    return [
+        event
+        for event in events
+        if int(event["id"].split("-")[1]) > sequence and matches(event, filters)
+    ]
+
+
+def format_event(event) -> str:
+    data = json.dumps(
+        {key: value for key, value in event.items() if key != "id"},
+        ensure_ascii=False,
+    )
+    if "id" in event:
+        return f"id: {event['id']}\nevent: {event['type']}\ndata: {data}\n\n"
+    return f"event: {event['type']}\ndata: {data}\n\n"
+
+
+async def stream(filters: dict, last_event_id: str = None):
+    """
+    Server-Sent Events for the orders matching filters. A client resuming
+    with last_event_id first gets the events it missed, or a reset event
+    when those are no longer available and it should reload the list.
+    """
+    subscription = Subscription(filters)
+    with _lock:
+        _subscribers.add(subscription)
+    try:
+        # Subscribed before replaying, so nothing published meanwhile is lost;
+        # events already replayed are skipped below
+        replayed = set()
+        if last_event_id:
+            missed = _missed_events(last_event_id, filters)
+            if missed is None:
+                yield format_event({"type": RESET})
+            else:
+                for event in missed:
+                    replayed.add(event["id"])
+                    yield format_event(event)
+
+        while True:
+            try:
+                event = await asyncio.wait_for(
+                    subscription.queue.get(), EVENTS_HEARTBEAT
+                )
+            except asyncio.TimeoutError:
+                # Comment line keeping proxies from closing an idle stream
+                yield ": keep-alive\n\n"
+                continue
+            if event.get("id") in replayed:
+                continue
+            yield format_event(event)
+    finally:
+        with _lock:
+            _subscribers.discard(subscription)
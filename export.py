@@ -0,0 +1,109 @@
+# export.py
+import csv
+import io
+import json
+
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload, selectinload
+
+from database import SessionLocal
+from models import Order, Product
+from queries import filter_orders, paginate_orders, split_page
+
+# Orders fetched per round trip while streaming an export
+EXPORT_BATCH_SIZE = 500
+
+EXPORT_COLUMNS = [
+    "order_id",
+    "shipping_date",
+    "status",
+    "payment_system",
+    "total_amount",
+    "school",
+    "grade",
+    "letter",
+    "customer_name",
+    "customer_phone",
+    "customer_email",
+    "product_id",
+    "product_name",
+    "sku",
+    "price",
+    "quantity",
+    "amount",
+    "is_assembled",
+    "options",
+]
+
+
+def iter_product_lines(**filters):
+    """
+    Yield one flat dict per product line of the orders matching the GET /orders/ filters.
+    Orders are read in keyset batches with their own session, so memory stays bounded
+    by EXPORT_BATCH_SIZE however many orders match.
+    """
+    db = SessionLocal()
+    try:
+        cursor = None
+        while True:
+            query = select(Order).options(
+                joinedload(Order.customer),
+                selectinload(Order.products).selectinload(Product.options),
+            )
+            query = filter_orders(query, **filters)
+            query = paginate_orders(query, cursor, EXPORT_BATCH_SIZE)
+            orders, cursor = split_page(db.scalars(query).all(), EXPORT_BATCH_SIZE)
+
+            for order in orders:
+                for product in order.products:
+                    yield {
+                        "order_id": order.order_id,
+                        "shipping_date": order.shipping_date.isoformat(),
+                        "status": order.status.value,
+                        "payment_system": order.payment_system,
+                        "total_amount": str(order.total_amount),
+                        "school": order.school,
+                        "grade": order.grade,
+                        "letter": order.letter,
+                        "customer_name": order.customer.name,
+                        "customer_phone": order.customer.phone,
+                        "customer_email": order.customer.email,
+                        "product_id": product.id,
+                        "product_name": product.name,
+                        "sku": product.sku,
+                        "price": str(product.price),
+                        "quantity": product.quantity,
+                        "amount": str(product.amount),
+                        "is_assembled": bool(product.is_assembled),
+                        "options": "; ".join(
+                            f"{option.option_name}: {option.variant}"
+                            for option in product.options
+                        ),
+                    }
+
+            # Drop the finished batch from the identity map before fetching the next one
+            db.expunge_all()
+            if not cursor:
+                break
+    finally:
+        db.close()
+
+
+def stream_csv(rows):
+    # The BOM lets spreadsheet apps detect UTF-8 and show school names correctly
+    buffer = io.StringIO("\ufeff")
+    buffer.seek(0, io.SEEK_END)
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+    writer.writeheader()
+    for i, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if i % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def stream_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + "\n"
@@ -0,0 +1,147 @@
+# inbox.py
+import asyncio
+import json
+import os
+from datetime import timedelta
+
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+
+import events
+import tracking
+from database import begin_write, open_session
+from ingest import ingest_order
+from models import InboxStatusEnum, StatusEnum, WebhookInboxEntry, local_now
+
+# "inline" ingests webhooks inside the request, "inbox" only journals the raw
+# payload and acknowledges; the worker below does the ingestion
+WEBHOOK_MODE = os.getenv("TILDA_WEBHOOK_MODE", "inline")
+
+INBOX_BATCH_SIZE = int(os.getenv("INBOX_BATCH_SIZE", 50))
+INBOX_POLL_INTERVAL = float(os.getenv("INBOX_POLL_INTERVAL", 1.0))
+INBOX_MAX_ATTEMPTS = int(os.getenv("INBOX_MAX_ATTEMPTS", 5))
+INBOX_RETRY_BACKOFF = timedelta(seconds=5)
+
+_wakeup = asyncio.Event()
+
+
+def notify_worker():
+    """Wake the worker up right away instead of at its next poll."""
+    _wakeup.set()
+
+
+# Payloads that can never be ingested; anything else may be transient
+MALFORMED_ERRORS = (ValueError, KeyError, TypeError)
+
+
+def _ingest(session, entry):
+    """
+    Stage one entry's order in a SAVEPOINT, so an entry that fails leaves the
+    rest of the batch intact. Malformed payloads go straight to the dead
+    letters, other errors are retried later. Returns the new order, if the
+    entry created one.
+    """
+    entry.attempts += 1
+    order = None
+    try:
+        with session.begin_nested():
+            customer_data = json.loads(entry.payload)
+            # Re-delivered orders are acknowledged without writing anything
+            if "test" not in customer_data:
+                order = ingest_order(session, customer_data)
+    except MALFORMED_ERRORS as e:
+        entry.status = InboxStatusEnum.dead
+        entry.last_error = f"Malformed payload: {e!r}"
+        return None
+    except Exception as e:
+        _retry_later(entry, e)
+        return None
+    entry.status = InboxStatusEnum.processed
+    entry.processed_at = local_now()
+    return order
+
+
+def _announce(orders):
+    """Tell the tracking cache and the event stream about committed orders."""
+    for order in orders:
+        if order is not None:
+            tracking.invalidate(order.order_id)
+            events.publish(
+                "order_created",
+                status=StatusEnum.new.value,
+                **events.order_fields(order),
+            )
+
+
+def _retry_later(entry, error):
+    # Counted as an attempt by the caller
+    entry.last_error = str(error)
+    if entry.attempts >= INBOX_MAX_ATTEMPTS:
+        entry.status = InboxStatusEnum.dead
+    else:
+        entry.next_attempt_at = local_now() + INBOX_RETRY_BACKOFF * 2**entry.attempts
+
+
+def process_inbox_batch(session, batch_size: int = INBOX_BATCH_SIZE) -> int:
+    """
+    Ingest the oldest due inbox entries with a single commit.
+    Each entry is dead-lettered or rescheduled on its own when it fails (see
+    _ingest); if the batch fails to commit, its entries are redone one commit
+    at a time so a single bad entry is retried (and eventually dead-lettered)
+    alone. Returns the number of entries picked up.
+    """
+    begin_write(session)
+    entries = session.scalars(
+        select(WebhookInboxEntry)
+        .where(
+            WebhookInboxEntry.status == InboxStatusEnum.pending,
+            WebhookInboxEntry.next_attempt_at <= local_now(),
+        )
+        .order_by(WebhookInboxEntry.next_attempt_at, WebhookInboxEntry.id)
+        .limit(batch_size)
+    ).all()
+    if not entries:
+        session.rollback()
+        return 0
+
+    try:
+        orders = [_ingest(session, entry) for entry in entries]
+        session.commit()
+        _announce(orders)
+    except SQLAlchemyError:
+        # The rollback expires the entries, so they reload their stored state
+        session.rollback()
+        for entry in entries:
+            try:
+                begin_write(session)
+                order = _ingest(session, entry)
+                session.commit()
+                _announce([order])
+            except SQLAlchemyError as e:
+                session.rollback()
+                entry.attempts += 1
+                _retry_later(entry, e)
+                session.commit()
+
+    return len(entries)
+
+
+async def run_inbox_worker():
+    """Drain the inbox until cancelled, sleeping between polls once it is empty."""
+    while True:
+        _wakeup.clear()
+        try:
+            db = open_session()
+            try:
+                processed = await db.run_sync(process_inbox_batch)
+            finally:
+                await db.close()
+        except Exception as e:
+            print(f"Inbox worker error: {e}")
+            processed = 0
+
+        if processed < INBOX_BATCH_SIZE:
+            try:
+                await asyncio.wait_for(_wakeup.wait(), INBOX_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
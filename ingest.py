@@ -0,0 +1,121 @@
+# ingest.py
+from datetime import datetime
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+
+from database import engine
+from models import Customer, Order, Product, ProductOption, StatusChange, StatusEnum
+from search import index_customer_orders
+from utils import customer_contact_key, get_next_shipping_day
+
+
+def tilda_order_id(customer_data: dict) -> str:
+    return str(customer_data["payment"]["orderid"])
+
+
+def order_exists(order_id: str):
+    """Primary-key lookup used to recognise re-delivered webhooks."""
+    return select(Order.order_id).where(Order.order_id == order_id)
+
+
+def upsert_customer(session, customer_data: dict) -> int:
+    """
+    INSERT ... ON CONFLICT on the customer's contact key, returning its id.
+    A parent ordering again reuses their row, refreshed with the latest
+    name and contact details.
+    """
+    values = dict(
+        name=customer_data["Name"],
+        phone=customer_data["Phone"],
+        email=customer_data["Email"],
+        contact_key=customer_contact_key(
+            customer_data["Email"], customer_data["Phone"]
+        ),
+    )
+    refreshed = ("name", "phone", "email")
+
+    if engine.dialect.name == "mysql":
+        # No RETURNING on MySQL: LAST_INSERT_ID(id) makes the id of an updated
+        # row the statement's lastrowid, as it is for an inserted one
+        statement = mysql.insert(Customer).values(**values)
+        statement = statement.on_duplicate_key_update(
+            id=func.last_insert_id(Customer.id),
+            **{key: statement.inserted[key] for key in refreshed},
+        )
+        return session.execute(statement).lastrowid
+
+    insert = postgresql.insert if engine.dialect.name == "postgresql" else sqlite.insert
+    statement = insert(Customer).values(**values)
+    return session.scalar(
+        statement.on_conflict_do_update(
+            index_elements=[Customer.contact_key],
+            set_={key: statement.excluded[key] for key in refreshed},
+        ).returning(Customer.id)
+    )
+
+
+def build_order(customer_data: dict) -> Order:
+    """
+    Build the order graph of a Tilda webhook payload in memory: order,
+    initial StatusChange, products and their options. The customer is
+    written separately with upsert_customer; set customer_id to its id.
+    Adding the returned order to a session persists everything in one flush,
+    with the products and options written as batched INSERTs.
+    Raises KeyError/ValueError on malformed payloads.
+    """
+    payment_data = customer_data["payment"]
+
+    products = []
+    for product_data in payment_data["products"]:
+        products.append(
+            Product(
+                name=product_data["name"],
+                sku=product_data["sku"],
+                price=product_data["price"],
+                quantity=product_data["quantity"],
+                amount=product_data["amount"],
+                options=[
+                    ProductOption(
+                        option_name=option_data["option"],
+                        variant=option_data["variant"],
+                    )
+                    for option_data in product_data.get("options", [])
+                ],
+            )
+        )
+
+    return Order(
+        order_id=tilda_order_id(customer_data),
+        payment_system=customer_data["paymentsystem"],
+        total_amount=payment_data["amount"],
+        form_id=customer_data["formid"],
+        form_name=customer_data["formname"],
+        shipping_date=get_next_shipping_day(datetime.now()),
+        school=customer_data["school"],
+        grade=int(customer_data["grade"]),
+        letter=customer_data["letter"],
+        status_changes=[StatusChange(status=StatusEnum.new)],
+        products=products,
+    )
+
+
+def ingest_order(session, customer_data: dict):
+    """
+    Stage a webhook's customer upsert and order graph in the session and
+    flush them, without committing. Returns the new order, or None when the
+    order is already stored (a re-delivery).
+    Raises KeyError/ValueError on malformed payloads.
+    """
+    if session.scalar(order_exists(tilda_order_id(customer_data))) is not None:
+        return None
+    # Build (and so validate) the order first: a malformed payload must not
+    # leave its customer upsert behind in the transaction
+    order = build_order(customer_data)
+    customer_id = upsert_customer(session, customer_data)
+    order.customer_id = customer_id
+    session.add(order)
+    # Flush so a second delivery later in the same transaction sees this order
+    session.flush()
+    index_customer_orders(session, customer_id)
+    return order
@@ -0,0 +1,153 @@
+# mailer.py
+import asyncio
+import os
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.utils import formatdate, make_msgid
+
+import aiosmtplib
+from fastapi_mail import ConnectionConfig, MessageSchema
+
+MAIL_POOL_SIZE = int(os.getenv("MAIL_POOL_SIZE", 2))
+MAIL_BATCH_SIZE = int(os.getenv("MAIL_BATCH_SIZE", 50))
+
+
+class Mailer:
+    """
+    Long-lived email sender. Messages are queued and delivered by pool_size
+    workers, each keeping one authenticated SMTP connection open and sending
+    up to batch_size queued messages per wake-up, so a burst of notifications
+    costs one handshake per worker instead of one per message.
+    """
+
+    def __init__(
+        self,
+        config: ConnectionConfig,
+        pool_size: int = MAIL_POOL_SIZE,
+        batch_size: int = MAIL_BATCH_SIZE,
+    ):
+        self.config = config
+        self.pool_size = pool_size
+        self.batch_size = batch_size
+        self.queue = None
+        self._loop = None
+        self._workers = []
+        self._connections = [None] * pool_size
+
+    def start(self):
+        # Workers belong to the loop that started them; a new loop (e.g. a
+        # test client without lifespan) gets its own queue and workers
+        loop = asyncio.get_running_loop()
+        if self._workers and self._loop is loop:
+            return
+        self._loop = loop
+        self._connections = [None] * self.pool_size
+        self.queue = asyncio.Queue()
+        self._workers = [
+            asyncio.create_task(self._worker(worker))
+            for worker in range(self.pool_size)
+        ]
+
+    async def stop(self, timeout: float = 10):
+        """Deliver what is still queued (up to timeout), then close the connections."""
+        if not self._workers:
+            return
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            print(f"Mailer stopped with {self.queue.qsize()} emails undelivered")
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def send(self, message: MessageSchema):
+        """Queue a message for delivery; must be called from the event loop."""
+        if message.attachments or message.template_body or message.alternative_body:
+            raise ValueError("Mailer sends plain bodies only")
+        self.start()
+        self.queue.put_nowait(message)
+
+    def send_many(self, messages):
+        for message in messages:
+            self.send(message)
+
+    def _sender(self):
+        if self.config.MAIL_FROM_NAME is not None:
+            return f"{self.config.MAIL_FROM_NAME} <{self.config.MAIL_FROM}>"
+        return self.config.MAIL_FROM
+
+    def _mime(self, message: MessageSchema):
+        mime = MIMEMultipart(message.multipart_subtype.value)
+        mime.set_charset(message.charset)
+        mime.attach(
+            MIMEText(message.body or "", message.subtype.value, message.charset)
+        )
+        mime["Date"] = formatdate(localtime=True)
+        mime["Message-ID"] = make_msgid()
+        mime["To"] = ", ".join(message.recipients)
+        mime["From"] = self._sender()
+        mime["Subject"] = message.subject
+        # aiosmtplib delivers to Cc and Bcc and strips Bcc from the sent copy
+        for name, addresses in (("Cc", message.cc), ("Bcc", message.bcc)):
+            if addresses:
+                mime[name] = ", ".join(addresses)
+        if message.reply_to:
+            mime["Reply-To"] = ", ".join(message.reply_to)
+        for name, value in (message.headers or {}).items():
+            mime[name] = value
+        return mime
+
+    async def _connect(self):
+        smtp = aiosmtplib.SMTP(
+            hostname=self.config.MAIL_SERVER,
+            port=self.config.MAIL_PORT,
+            timeout=self.config.TIMEOUT,
+            use_tls=self.config.MAIL_SSL_TLS,
+            start_tls=self.config.MAIL_STARTTLS,
+            validate_certs=self.config.VALIDATE_CERTS,
+        )
+        await smtp.connect()
+        if self.config.USE_CREDENTIALS:
+            await smtp.login(self.config.MAIL_USERNAME, self.config.MAIL_PASSWORD)
+        return smtp
+
+    async def _deliver(self, worker: int, message: MessageSchema):
+        """Send one message on the worker's connection, reconnecting once if the server dropped it."""
+        mime = self._mime(message)
+        if self.config.SUPPRESS_SEND:
+            return
+        for attempt in range(2):
+            smtp = self._connections[worker]
+            if smtp is None or not smtp.is_connected:
+                smtp = self._connections[worker] = await self._connect()
+            try:
+                await smtp.send_message(mime)
+                return
+            except aiosmtplib.SMTPServerDisconnected:
+                # Idle connections get closed by the server; retry on a fresh one
+                self._connections[worker] = None
+                if attempt:
+                    raise
+
+    async def _worker(self, worker: int):
+        try:
+            while True:
+                batch = [await self.queue.get()]
+                while len(batch) < self.batch_size and not self.queue.empty():
+                    batch.append(self.queue.get_nowait())
+
+                for message in batch:
+                    try:
+                        await self._deliver(worker, message)
+                    except Exception as e:
+                        print(f"Failed to send email to {message.recipients}: {e}")
+                    finally:
+                        self.queue.task_done()
+        finally:
+            smtp, self._connections[worker] = self._connections[worker], None
+            if smtp is not None and smtp.is_connected:
+                try:
+                    await smtp.quit()
+                except aiosmtplib.SMTPException:
+                    pass
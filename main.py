@@ -1,47 +1,130 @@
 # main.py
+import asyncio
 from collections import defaultdict
+from contextlib import asynccontextmanager
 import os
+import tempfile
 from dotenv import load_dotenv
-from datetime import datetime, timedelta
-from fastapi import FastAPI, Depends, HTTPException, Request, status, BackgroundTasks
+from datetime import timedelta
+from fastapi import (
+    FastAPI,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    status,
+)
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from bulk import assemble_products, transition_orders
 from auth import (
     create_access_token,
     decode_access_token,
     get_current_user,
-    verify_password,
+    verify_password_async,
 )
 from models import (
-    Customer,
     Order,
     Product,
     ProductOption,
     StatusChange,
     StatusEnum,
     User,
+    WebhookInboxEntry,
     Base,
 )
-from database import SessionLocal, engine, get_db
+from database import (
+    ThreadedSessionLocal,
+    async_engine,
+    create_schema,
+    engine,
+    get_db,
+)
 import json
+from export import iter_product_lines, stream_csv, stream_ndjson
+from inbox import WEBHOOK_MODE, notify_worker, run_inbox_worker
+import events
+from mailer import Mailer
+from order_json import (
+    load_products,
+    order_rows_query,
+    order_summary_query,
+    render_orders,
+    render_summaries,
+)
+from metrics import MetricsMiddleware, instrument_engine, render_metrics
+import tracking
+from picklists import generate_pick_lists, zip_files
+from picklists import shutdown_pool as shutdown_pick_list_pool
+from ingest import ingest_order, order_exists, tilda_order_id
 from schemas import (
+    BulkAssembleResponseSchema,
+    BulkAssembleSchema,
+    BulkStatusResponseSchema,
+    BulkStatusUpdateSchema,
     EmailSchema,
     OrderSchema,
+    OrderSummarySchema,
     ProductSchema,
     TrackOrderSchema,
     UserSchema,
 )
 from typing import Any, Dict, List
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig
-
-from utils import SCHOOLS, get_next_shipping_day
+from fastapi_mail import MessageSchema, ConnectionConfig
+
+from queries import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    filter_orders,
+    paginate_orders,
+    split_page,
+)
+from search import (
+    MAX_SEARCH_LIMIT,
+    SEARCH_LIMIT,
+    create_search_index,
+    search_orders,
+)
+from stats import (
+    DEFAULT_GROUP_BY,
+    order_totals_query,
+    parse_group_by,
+    product_units_query,
+    to_table,
+)
+from writer import WRITE_MODE, GroupCommitWriter
 
 load_dotenv()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # In inbox mode webhooks are ingested by a background worker
+    worker = None
+    if WEBHOOK_MODE == "inbox":
+        worker = asyncio.create_task(run_inbox_worker())
+    mailer.start()
+    if writer:
+        writer.start()
+    yield
+    if worker:
+        worker.cancel()
+    if writer:
+        await writer.stop()
+    await mailer.stop()
+    shutdown_pick_list_pool()
+
+
 # Initialize the FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -49,10 +132,20 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allows all HTTP methods (GET, POST, etc.)
     allow_headers=["*"],  # Allows all headers
+    expose_headers=["X-Next-Cursor"],  # Lets the frontend read the pagination cursor
 )
 
-# Create the tables in the database
-Base.metadata.create_all(bind=engine)
+# Per-route latency, SQL statement count, DB time and response size, see /metrics
+app.add_middleware(MetricsMiddleware)
+instrument_engine(engine)
+if async_engine:
+    instrument_engine(async_engine.sync_engine)
+
+# Create the tables in the database and add columns/indexes missing from
+# databases created by earlier versions
+create_schema(Base.metadata)
+# Full-text index behind GET /orders/search, filled on first start
+create_search_index()
 
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
@@ -70,13 +163,34 @@ conf = ConnectionConfig(
     VALIDATE_CERTS=True,
 )
 
+# One long-lived sender for every notification, see mailer.py
+mailer = Mailer(conf)
+
+# In "group" write mode the writing endpoints share one committer, see writer.py
+writer = GroupCommitWriter(ThreadedSessionLocal) if WRITE_MODE == "group" else None
+
+
+async def commit_write(db, unit, *args):
+    """
+    Run a write unit (a function of a sync Session that stages changes) and
+    commit it, on the request session or batched by the group-commit writer.
+    """
+    if writer:
+        return await writer.submit(unit, *args)
+    result = await db.run_sync(unit, *args)
+    await db.commit()
+    return result
+
 
 @app.post("/token")
 async def login_for_access_token(
-    form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    db: AsyncSession = Depends(get_db),
 ):
-    user = db.query(User).filter(User.username == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    user = await db.scalar(select(User).where(User.username == form_data.username))
+    if not user or not await verify_password_async(
+        form_data.password, user.hashed_password
+    ):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -97,7 +211,16 @@ async def read_users_me(
 
 
 @app.post("/tilda/orders/")
-async def tilda_order_webhook(request: Request, db: Session = Depends(get_db)):
+async def tilda_order_webhook(request: Request, db: AsyncSession = Depends(get_db)):
+    if WEBHOOK_MODE == "inbox":
+        # Journal the raw payload and acknowledge right away; malformed
+        # payloads are dead-lettered by the worker instead of rejected here
+        payload = (await request.body()).decode("utf-8", errors="replace")
+        db.add(WebhookInboxEntry(payload=payload))
+        await db.commit()
+        notify_worker()
+        return {"status": "queued"}
+
     try:
         customer_data = await request.json()
         if "test" in customer_data:
@@ -106,78 +229,30 @@ async def tilda_order_webhook(request: Request, db: Session = Depends(get_db)):
         formatted_data = json.dumps(customer_data, indent=4)
         print(formatted_data)  # This will print formatted JSON to the terminal
 
-        name = customer_data["Name"]
-        phone = customer_data["Phone"]
-        email = customer_data["Email"]
-        school = customer_data["school"]
-        grade = int(customer_data["grade"])
-        letter = customer_data["letter"]
-
-        customer = Customer(name=name, phone=phone, email=email)
-        db.add(customer)
-        db.commit()
-        db.refresh(customer)
-
-        payment_data = customer_data["payment"]
-        order_id = payment_data["orderid"]
-        payment_system = customer_data["paymentsystem"]
-        total_amount = payment_data["amount"]
-        form_id = customer_data["formid"]
-        form_name = customer_data["formname"]
-        order_date = datetime.now()
-
-        shipping_date = get_next_shipping_day(order_date)
-
-        order = Order(
-            customer_id=customer.id,
-            order_id=order_id,
-            payment_system=payment_system,
-            total_amount=total_amount,
-            form_id=form_id,
-            form_name=form_name,
-            shipping_date=shipping_date,
-            school=school,
-            grade=grade,
-            letter=letter,
-        )
-        db.add(order)
-        status_change = StatusChange(order_id=order.order_id, status=StatusEnum.new)
-        db.add(status_change)
-        db.commit()
-        db.refresh(order)
-
-        for product_data in payment_data["products"]:
-            product_name = product_data["name"]
-            sku = product_data["sku"]
-            price = product_data["price"]
-            quantity = product_data["quantity"]
-            amount = product_data["amount"]
-
-            product = Product(
-                order_id=order.order_id,
-                name=product_name,
-                sku=sku,
-                price=price,
-                quantity=quantity,
-                amount=amount,
+        # Tilda re-delivers webhooks it considers failed; acknowledge repeats
+        # of an order we already have without writing anything
+        order_id = tilda_order_id(customer_data)
+        if await db.scalar(order_exists(order_id)) is not None:
+            return {"status": "success"}
+
+        # One transaction for the customer upsert and one flush for the order,
+        # status history, products and options
+        try:
+            order = await commit_write(db, ingest_order, customer_data)
+        except IntegrityError:
+            # A concurrent delivery of the same order committed first
+            await db.rollback()
+            if await db.scalar(order_exists(order_id)) is None:
+                raise
+        else:
+            if order is None:
+                return {"status": "success"}
+            events.publish(
+                "order_created",
+                status=StatusEnum.new.value,
+                **events.order_fields(order),
             )
-            db.add(product)
-            db.commit()
-            db.refresh(product)
-
-            if "options" in product_data:
-                for option_data in product_data["options"]:
-                    option_name = option_data["option"]
-                    variant = option_data["variant"]
-
-                    product_option = ProductOption(
-                        product_id=product.id,
-                        option_name=option_name,
-                        variant=variant,
-                    )
-                    db.add(product_option)
-
-        db.commit()
+        tracking.invalidate(order_id)
 
         return {"status": "success"}
 
@@ -188,71 +263,254 @@ async def tilda_order_webhook(request: Request, db: Session = Depends(get_db)):
 
 @app.get("/orders/", response_model=List[OrderSchema])
 async def get_orders(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
     shipping_date: str = None,
     school: int = None,
     grade: str = None,
     letter: str = None,
     payed: bool = None,
+    cursor: str = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
 ):
-    closest_shipping_date = get_next_shipping_day(datetime.now())
-    next_shipping_date = get_next_shipping_day(closest_shipping_date)
-    closest_shipping_date = closest_shipping_date.date()
-    next_shipping_date = next_shipping_date.date()
-
-    # Base query to get all orders
-    query = db.query(Order)
-
-    # Filter by shipping_date
-    if shipping_date:
-        if shipping_date == "closest":
-            query = query.filter(Order.shipping_date == closest_shipping_date)
-        elif shipping_date == "next":
-            query = query.filter(Order.shipping_date == next_shipping_date)
-        elif shipping_date == "previous":
-            query = query.filter(Order.shipping_date < closest_shipping_date)
-        else:
-            raise HTTPException(status_code=400, detail="Invalid shipping date filter")
+    # Plain rows instead of ORM objects: the page is rendered straight to
+    # JSON by render_orders, with the same bytes OrderSchema would produce
+    query = order_rows_query()
+    query = filter_orders(query, shipping_date, school, grade, letter, payed)
+    query = paginate_orders(query, cursor, limit)
+
+    # Execute query and get one page of results
+    rows, next_cursor = split_page((await db.execute(query)).all(), limit)
+    products = await db.run_sync(load_products, [row.order_id for row in rows])
+    body = render_orders(rows, products)
+
+    # The cursor of the following page is returned in a header so the body
+    # keeps its shape; it is absent on the last page
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return Response(body, media_type="application/json", headers=headers)
+
+
+@app.get("/orders/summary", response_model=List[OrderSummarySchema])
+async def get_order_summaries(
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+    shipping_date: str = None,
+    school: int = None,
+    grade: str = None,
+    letter: str = None,
+    payed: bool = None,
+    cursor: str = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+):
+    # GET /orders/ without the nested customer and products, for list screens:
+    # same filters and cursor, one grouped query for the page
+    query = order_summary_query()
+    query = filter_orders(query, shipping_date, school, grade, letter, payed)
+    query = paginate_orders(query, cursor, limit)
+
+    rows, next_cursor = split_page((await db.execute(query)).all(), limit)
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return Response(
+        render_summaries(rows), media_type="application/json", headers=headers
+    )
 
-    if school:
-        query = query.filter(Order.school == SCHOOLS[school])
 
-    # Filter by grade
-    if grade:
-        query = query.filter(Order.grade == grade)
+@app.get("/orders/search", response_model=List[OrderSummarySchema])
+async def search_order_summaries(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(SEARCH_LIMIT, ge=1, le=MAX_SEARCH_LIMIT),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    # Orders by a parent's name, phone fragment or email, an order id or a
+    # product name/SKU, as /orders/summary lines; words under three
+    # characters are ignored
+    rows = await db.run_sync(search_orders, q, limit)
+    return Response(render_summaries(rows), media_type="application/json")
 
-    # Filter by grade and letter (if both are provided)
-    if letter:
-        if not grade:
-            raise HTTPException(
-                status_code=400, detail="Grade must be provided if filtering by letter"
-            )
-        query = query.filter(Order.grade == grade, Order.letter == letter)
 
-    if payed is not None:
-        if payed == True:
-            query = query.filter(Order.status != StatusEnum.new)
-        else:
-            query = query.filter(Order.status == StatusEnum.new)
+@app.get("/orders/export")
+def export_orders(
+    current_user: User = Depends(get_current_user),
+    shipping_date: str = None,
+    school: int = None,
+    grade: str = None,
+    letter: str = None,
+    payed: bool = None,
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+):
+    filters = dict(
+        shipping_date=shipping_date,
+        school=school,
+        grade=grade,
+        letter=letter,
+        payed=payed,
+    )
+    # Validate the filters before the response starts streaming
+    filter_orders(select(Order), **filters)
+
+    rows = iter_product_lines(**filters)
+    if format == "ndjson":
+        return StreamingResponse(stream_ndjson(rows), media_type="application/x-ndjson")
+    return StreamingResponse(
+        stream_csv(rows),
+        media_type="text/csv; charset=utf-8",
+        headers={"Content-Disposition": 'attachment; filename="orders.csv"'},
+    )
 
-    # Execute query and get results
-    orders = query.all()
 
-    # Return the filtered list of orders
-    return orders
+def status_update_message(order_id: str, email: str, status: str) -> MessageSchema:
+    return MessageSchema(
+        subject="Order Status Update",
+        recipients=[email],  # List of recipients
+        body=f"Your order with ID {order_id} has been updated to status: {status}",
+        subtype="html",
+        headers={  # Add these headers to mark the email as important
+            "Importance": "high",  # For Outlook and other clients
+            "X-Priority": "1",  # 1 = High, 3 = Normal, 5 = Low (RFC standard)
+            "X-MSMail-Priority": "High",  # For Microsoft email clients
+        },
+    )
 
 
-@app.patch("/orders/{order_id}", response_model=OrderSchema)
-async def update_order(
-    order_id: str,
-    status: str,
-    background_tasks: BackgroundTasks,  # Use BackgroundTasks as a dependency
-    db: Session = Depends(get_db),
+@app.post("/orders/bulk-status", response_model=BulkStatusResponseSchema)
+async def bulk_update_order_status(
+    update: BulkStatusUpdateSchema,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    filters = dict(
+        shipping_date=update.shipping_date,
+        school=update.school,
+        grade=update.grade,
+        letter=update.letter,
+        payed=update.payed,
+    )
+    has_filters = any(value is not None for value in filters.values())
+    if (update.order_ids is None) == (not has_filters):
+        raise HTTPException(
+            status_code=400,
+            detail="Provide either order_ids or at least one filter, not both",
+        )
+    if update.order_ids is None:
+        # Validate the filters before opening the transaction
+        filter_orders(select(Order), **filters)
+
+    status = StatusEnum(update.status.value)
+    from_status = StatusEnum(update.from_status.value) if update.from_status else None
+    results, changed = await db.run_sync(
+        transition_orders, status, update.order_ids, filters, from_status
+    )
+    tracking.invalidate(*(order.order_id for order in changed))
+    for order in changed:
+        events.publish(
+            "order_status", status=status.value, **events.order_fields(order)
+        )
+
+    # One batch for the whole transition, delivered by the pooled sender
+    mailer.send_many(
+        status_update_message(order.order_id, order.email, status.value)
+        for order in changed
+        if order.email
+    )
+
+    print(f"{len(changed)} orders updated to status: {status.value}")
+    return {"status": status, "updated": len(changed), "results": results}
+
+
+@app.get("/stats/orders")
+async def order_stats(
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
+    group_by: str = DEFAULT_GROUP_BY,
+    shipping_date: str = None,
+    school: int = None,
+    grade: str = None,
+    letter: str = None,
+    payed: bool = None,
 ):
+    """Order count, unpaid orders and revenue per group of orders."""
+    query = order_totals_query(parse_group_by(group_by))
+    query = filter_orders(query, shipping_date, school, grade, letter, payed)
+    return to_table(await db.execute(query))
 
-    order = db.query(Order).filter(Order.order_id == order_id).first()
+
+@app.get("/stats/units")
+async def unit_stats(
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+    group_by: str = DEFAULT_GROUP_BY,
+    shipping_date: str = None,
+    school: int = None,
+    grade: str = None,
+    letter: str = None,
+    payed: bool = None,
+):
+    """Units ordered per SKU and option variant per group of orders."""
+    query = product_units_query(parse_group_by(group_by))
+    query = filter_orders(query, shipping_date, school, grade, letter, payed)
+    return to_table(await db.execute(query))
+
+
+@app.get("/pick-lists")
+def download_pick_lists(
+    current_user: User = Depends(get_current_user),
+    shipping_date: str = "closest",
+    school: int = None,
+):
+    """Zip of the HTML and CSV pick-list of every class shipping on shipping_date."""
+    # Validate the filters before starting the workers
+    filter_orders(select(Order), shipping_date=shipping_date, school=school)
+
+    with tempfile.TemporaryDirectory(prefix="pick-lists-") as directory:
+        archive = zip_files(generate_pick_lists(directory, shipping_date, school))
+    return Response(
+        archive,
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": f'attachment; filename="pick-lists-{shipping_date}.zip"'
+        },
+    )
+
+
+@app.get("/orders/events")
+async def order_events(
+    current_user: User = Depends(get_current_user),
+    shipping_date: str = None,
+    school: int = None,
+    grade: str = None,
+    letter: str = None,
+    last_event_id: str = Header(None),
+):
+    """
+    Server-Sent Events for changes to the orders matching the filters:
+    order_created, order_status, product_assembled and order_assembly, each
+    carrying the order id and the changed fields. Reconnecting with
+    Last-Event-ID replays what was missed; a reset event means the client
+    should reload the list instead.
+    """
+    # Validate the filters before the stream starts
+    filter_orders(select(Order), shipping_date, school, grade, letter)
+    filters = dict(
+        shipping_date=shipping_date, school=school, grade=grade, letter=letter
+    )
+    return StreamingResponse(
+        events.stream(filters, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def change_order_status(session, order_id: str, status: str) -> Order:
+    """Write unit of PATCH /orders/{order_id}: the new status and its history row."""
+    order = session.scalar(
+        select(Order)
+        .options(
+            joinedload(Order.customer),
+            selectinload(Order.products).selectinload(Product.options),
+        )
+        .where(Order.order_id == order_id)
+    )
 
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
@@ -270,30 +528,27 @@ async def update_order(
         )
 
     order.status = StatusEnum(status)
-    status_change = StatusChange(order_id=order_id, status=status)
-    customer = db.query(Customer).filter(Customer.id == order.customer_id).first()
-    db.add(status_change)
-    db.commit()
-    db.refresh(order)
+    session.add(StatusChange(order_id=order_id, status=status))
+    return order
 
-    message = MessageSchema(
-        subject="Order Status Update",
-        recipients=[customer.email],  # List of recipients
-        body=f"Your order with ID {order_id} has been updated to status: {status}",
-        subtype="html",
-        headers={  # Add these headers to mark the email as important
-            "Importance": "high",  # For Outlook and other clients
-            "X-Priority": "1",  # 1 = High, 3 = Normal, 5 = Low (RFC standard)
-            "X-MSMail-Priority": "High",  # For Microsoft email clients
-        },
-    )
+
+@app.patch("/orders/{order_id}", response_model=OrderSchema)
+async def update_order(
+    order_id: str,
+    status: str,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    order = await commit_write(db, change_order_status, order_id, status)
+    customer = order.customer
+    tracking.invalidate(order_id)
+    events.publish("order_status", status=status, **events.order_fields(order))
+
+    message = status_update_message(order_id, customer.email, status)
 
     # Try to send the email, handle exceptions
     try:
-        fm = FastMail(conf)
-        background_tasks.add_task(
-            fm.send_message, message
-        )  # Queue email sending in the background
+        mailer.send(message)  # Delivered in the background over a pooled connection
         print(f"Email queued for order {order_id} status update.")
     except Exception as e:
         raise HTTPException(
@@ -304,34 +559,121 @@ async def update_order(
     return order
 
 
+def set_product_assembled(session, product_id: int, assemble: bool) -> Product:
+    """Write unit of PATCH /products/{product_id}."""
+    product = session.scalar(
+        select(Product)
+        .options(selectinload(Product.options), joinedload(Product.order))
+        .where(Product.id == product_id)
+    )
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found")
+    product.is_assembled = assemble
+    return product
+
+
 @app.patch("/products/{product_id}", response_model=ProductSchema)
-def assemble_product(
+async def assemble_product(
     product_id: int,
     assemble: bool,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    product = db.query(Product).filter(Product.id == product_id).first()
-    if not product:
-        raise HTTPException(status_code=404, detail="Product not found")
-    product.is_assembled = assemble
-    db.commit()
-    db.refresh(product)
+    product = await commit_write(db, set_product_assembled, product_id, assemble)
+    tracking.invalidate(product.order_id)
+    events.publish(
+        "product_assembled",
+        product_id=product.id,
+        is_assembled=assemble,
+        **events.order_fields(product.order),
+    )
     return product
 
 
+@app.post("/products/bulk-assemble", response_model=BulkAssembleResponseSchema)
+async def bulk_assemble_products(
+    update: BulkAssembleSchema,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    filters = dict(
+        shipping_date=update.shipping_date,
+        school=update.school,
+        grade=update.grade,
+        letter=update.letter,
+    )
+    has_filters = any(value is not None for value in filters.values())
+    selectors = [update.product_ids is not None, update.order_ids is not None]
+    if selectors.count(True) + has_filters != 1:
+        raise HTTPException(
+            status_code=400,
+            detail="Provide exactly one of product_ids, order_ids or class filters",
+        )
+    if has_filters:
+        # Validate the filters before opening the transaction
+        filter_orders(select(Order), **filters)
+
+    updated, orders = await db.run_sync(
+        assemble_products,
+        update.assemble,
+        update.product_ids,
+        update.order_ids,
+        filters,
+    )
+    tracking.invalidate(*(order.order_id for order in orders))
+
+    summaries = []
+    for order in orders:
+        summary = {
+            "assembled": order.assembled,
+            "total": order.total,
+            "complete": order.assembled == order.total,
+        }
+        events.publish("order_assembly", **summary, **events.order_fields(order))
+        summaries.append({"order_id": order.order_id, **summary})
+    return {"updated": updated, "orders": summaries}
+
+
 @app.get("/order-tracking/{order_id}", response_model=TrackOrderSchema)
-def track_order(order_id: int, db: Session = Depends(get_db)):
-    order = db.query(Order).filter(Order.order_id == order_id).first()
+async def track_order(
+    order_id: int,
+    db: AsyncSession = Depends(get_db),
+    if_none_match: str = Header(None),
+):
+    # Parents poll this page; answer from the cache (or with 304) when the
+    # order has not changed since it was last rendered
+    order_id = str(order_id)
+    cached = tracking.cached_response(order_id)
+    if cached is None:
+        since = tracking.generation()
+        order = await db.scalar(
+            select(Order)
+            .options(
+                selectinload(Order.products).selectinload(Product.options),
+                selectinload(Order.status_changes),
+            )
+            .where(Order.order_id == order_id)
+        )
 
-    if not order:
-        return {"detail": "Order not found"}
+        if not order:
+            raise HTTPException(status_code=404, detail="Order not found")
 
-    return order
+        cached = tracking.render_response(order, since)
+
+    etag, body = cached
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if tracking.etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+@app.get("/metrics")
+def read_metrics():
+    return Response(render_metrics(), media_type="text/plain; version=0.0.4")
 
 
 @app.post("/send-email")
-def send_email(email: EmailSchema, background_tasks: BackgroundTasks):
+async def send_email(email: EmailSchema):
     message = MessageSchema(
         subject=email.subject,
         recipients=[email.email],
@@ -341,8 +683,7 @@ def send_email(email: EmailSchema, background_tasks: BackgroundTasks):
 
     # Try to send the email, handle exceptions
     try:
-        fm = FastMail(conf)
-        background_tasks.add_task(fm.send_message, message)
+        mailer.send(message)
         print(f"Email queued for {email.email}")
     except Exception as e:
         raise HTTPException(
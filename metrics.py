@@ -0,0 +1,203 @@
+# metrics.py
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+# Upper bounds of the request latency histogram, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Requests slower than this many seconds are printed with the SQL they ran;
+# unset disables the log (and the per-request statement capture)
+SLOW_REQUEST_SECONDS = os.getenv("SLOW_REQUEST_SECONDS")
+SLOW_REQUEST_SECONDS = float(SLOW_REQUEST_SECONDS) if SLOW_REQUEST_SECONDS else None
+SLOW_REQUEST_MAX_STATEMENTS = 50
+
+
+class RequestStats:
+    __slots__ = ("statements", "db_time", "sql")
+
+    def __init__(self):
+        self.statements = 0
+        self.db_time = 0.0
+        self.sql = [] if SLOW_REQUEST_SECONDS is not None else None
+
+
+class RouteMetrics:
+    __slots__ = ("buckets", "count", "duration", "statements", "db_time", "bytes")
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.duration = 0.0
+        self.statements = 0
+        self.db_time = 0.0
+        self.bytes = 0
+
+
+# The stats of the request being served; the object is shared with the
+# threadpool and the async driver's greenlets, which run in copies of the
+# request's context
+_current = ContextVar("request_stats", default=None)
+
+_routes = defaultdict(RouteMetrics)
+_responses = defaultdict(int)
+_lock = threading.Lock()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    stats = _current.get()
+    if stats is None:
+        return
+    stats.statements += 1
+    stats.db_time += elapsed
+    if stats.sql is not None and len(stats.sql) < SLOW_REQUEST_MAX_STATEMENTS:
+        stats.sql.append((elapsed, statement))
+
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute
+    start = exception_context.connection and exception_context.connection.info.get(
+        "query_start"
+    )
+    if start:
+        start.pop()
+
+
+def instrument_engine(engine):
+    """Count the statements and DB time of every request on this (sync) engine."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+def _record(method, route, status, elapsed, stats, size):
+    with _lock:
+        metrics = _routes[(method, route)]
+        metrics.buckets[bisect_left(LATENCY_BUCKETS, elapsed)] += 1
+        metrics.count += 1
+        metrics.duration += elapsed
+        metrics.statements += stats.statements
+        metrics.db_time += stats.db_time
+        metrics.bytes += size
+        _responses[(method, route, status)] += 1
+
+
+def _log_slow_request(method, path, status, elapsed, stats):
+    print(
+        f"Slow request: {method} {path} -> {status} in {elapsed * 1000:.1f} ms, "
+        f"{stats.statements} SQL statements in {stats.db_time * 1000:.1f} ms"
+    )
+    for duration, statement in stats.sql:
+        print(f"  {duration * 1000:8.2f} ms  {' '.join(statement.split())}")
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware timing every HTTP request and attributing its SQL
+    statements, DB time and response bytes to the matched route template.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        status = 500
+        size = 0
+
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _current.reset(token)
+            # Labelled by route template, so order ids do not multiply series
+            route = scope.get("route")
+            route = route.path if route is not None else "unmatched"
+            _record(scope["method"], route, status, elapsed, stats, size)
+            if SLOW_REQUEST_SECONDS is not None and elapsed >= SLOW_REQUEST_SECONDS:
+                _log_slow_request(
+                    scope["method"], scope["path"], status, elapsed, stats
+                )
+
+
+def _labels(**labels):
+    def escape(value):
+        return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+    pairs = (f'{name}="{escape(value)}"' for name, value in labels.items())
+    return "{" + ",".join(pairs) + "}"
+
+
+def render_metrics() -> str:
+    """The collected metrics in the Prometheus text exposition format."""
+    with _lock:
+        snapshot = {
+            key: (
+                list(metrics.buckets),
+                metrics.count,
+                metrics.duration,
+                metrics.statements,
+                metrics.db_time,
+                metrics.bytes,
+            )
+            for key, metrics in _routes.items()
+        }
+        responses = dict(_responses)
+
+    lines = [
+        "# HELP http_requests_total Requests served, by route and status code.",
+        "# TYPE http_requests_total counter",
+    ]
+    for (method, route, status), count in sorted(responses.items()):
+        lines.append(
+            f"http_requests_total{_labels(method=method, route=route, status=status)} {count}"
+        )
+
+    lines += [
+        "# HELP http_request_duration_seconds Request latency, by route.",
+        "# TYPE http_request_duration_seconds histogram",
+    ]
+    for (method, route), (buckets, count, duration, *_) in sorted(snapshot.items()):
+        cumulative = 0
+        for bound, bucket in zip(LATENCY_BUCKETS + ("+Inf",), buckets):
+            cumulative += bucket
+            labels = _labels(method=method, route=route, le=bound)
+            lines.append(f"http_request_duration_seconds_bucket{labels} {cumulative}")
+        labels = _labels(method=method, route=route)
+        lines.append(f"http_request_duration_seconds_sum{labels} {duration}")
+        lines.append(f"http_request_duration_seconds_count{labels} {count}")
+
+    for name, help_text, index in (
+        ("http_request_sql_statements_total", "SQL statements run, by route.", 3),
+        ("http_request_db_seconds_total", "Time spent in SQL, by route.", 4),
+        ("http_response_bytes_total", "Response body bytes sent, by route.", 5),
+    ):
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+        for (method, route), values in sorted(snapshot.items()):
+            lines.append(f"{name}{_labels(method=method, route=route)} {values[index]}")
+
+    return "\n".join(lines) + "\n"
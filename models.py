@@ -10,6 +10,8 @@ from sqlalchemy import (
     ForeignKey,
     DECIMAL,
     Enum,
+    Index,
+    Text,
 )
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
@@ -28,6 +30,16 @@ class StatusEnum(enum.Enum):
     canceled = "canceled"
 
 
+class InboxStatusEnum(enum.Enum):
+    pending = "pending"
+    processed = "processed"
+    dead = "dead"
+
+
+def local_now():
+    return datetime.utcnow() + timedelta(hours=5)
+
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
@@ -52,6 +64,8 @@ class Customer(Base):
     name = Column(String(255))
     phone = Column(String(50))
     email = Column(String(255))
+    # Normalized email/phone, see utils.customer_contact_key
+    contact_key = Column(String(320), unique=True, index=True)
 
     orders = relationship("Order", back_populates="customer")
 
@@ -60,7 +74,7 @@ class Order(Base):
     __tablename__ = "orders"
 
     order_id = Column(String(50), primary_key=True, index=True)
-    customer_id = Column(Integer, ForeignKey("customers.id"))
+    customer_id = Column(Integer, ForeignKey("customers.id"), index=True)
     payment_system = Column(String(50))
     status = Column(Enum(StatusEnum), default=StatusEnum.new)
     school = Column(String(255))
@@ -75,12 +89,29 @@ class Order(Base):
     products = relationship("Product", back_populates="order")
     status_changes = relationship("StatusChange", back_populates="order")
 
+    # Composite indexes matching the GET /orders/ filter combinations; each
+    # ends in shipping_date so the keyset ordering can follow the index
+    __table_args__ = (
+        Index("ix_orders_shipping_date_order_id", "shipping_date", "order_id"),
+        Index(
+            "ix_orders_school_grade_letter_shipping_date",
+            "school",
+            "grade",
+            "letter",
+            "shipping_date",
+        ),
+        Index(
+            "ix_orders_grade_letter_shipping_date", "grade", "letter", "shipping_date"
+        ),
+        Index("ix_orders_status_shipping_date", "status", "shipping_date"),
+    )
+
 
 class Product(Base):
     __tablename__ = "products"
 
     id = Column(Integer, primary_key=True, index=True)
-    order_id = Column(Integer, ForeignKey("orders.order_id"))
+    order_id = Column(String(50), ForeignKey("orders.order_id"), index=True)
     name = Column(String(255))
     sku = Column(String(50))
     price = Column(DECIMAL(10, 2))
@@ -96,7 +127,7 @@ class ProductOption(Base):
     __tablename__ = "product_options"
 
     id = Column(Integer, primary_key=True, index=True)
-    product_id = Column(Integer, ForeignKey("products.id"))
+    product_id = Column(Integer, ForeignKey("products.id"), index=True)
     option_name = Column(String(255))
     variant = Column(String(255))
 
@@ -107,10 +138,25 @@ class StatusChange(Base):
     __tablename__ = "status_changes"
 
     id = Column(Integer, primary_key=True, index=True)
-    order_id = Column(String(50), ForeignKey("orders.order_id"))
+    order_id = Column(String(50), ForeignKey("orders.order_id"), index=True)
     status = Column(Enum(StatusEnum))
-    created_at = Column(
-        DateTime, default=lambda: datetime.utcnow() + timedelta(hours=5)
-    )
+    created_at = Column(DateTime, default=local_now)
 
     order = relationship("Order", back_populates="status_changes")
+
+
+class WebhookInboxEntry(Base):
+    __tablename__ = "webhook_inbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    payload = Column(Text)
+    status = Column(Enum(InboxStatusEnum), default=InboxStatusEnum.pending)
+    attempts = Column(Integer, default=0)
+    last_error = Column(Text)
+    received_at = Column(DateTime, default=local_now)
+    next_attempt_at = Column(DateTime, default=local_now)
+    processed_at = Column(DateTime)
+
+    __table_args__ = (
+        Index("ix_webhook_inbox_status_next_attempt_at", "status", "next_attempt_at"),
+    )
@@ -0,0 +1,175 @@
+# order_json.py
+from collections import defaultdict
+
+import orjson
+from sqlalchemy import case, func, select
+
+from bulk import chunked
+from models import Customer, Order, Product, ProductOption
+
+
+def order_rows_query():
+    """
+    select() of the order and customer columns OrderSchema serializes; filter
+    and paginate it like the ORM query (see queries.py) and pass the fetched
+    rows to render_orders.
+    """
+    return select(
+        Order.order_id,
+        Order.payment_system,
+        Order.status,
+        Order.school,
+        Order.grade,
+        Order.letter,
+        Order.total_amount,
+        Order.form_id,
+        Order.form_name,
+        Order.shipping_date,
+        Customer.id.label("customer_id"),
+        Customer.name.label("customer_name"),
+        Customer.phone.label("customer_phone"),
+        Customer.email.label("customer_email"),
+    ).outerjoin(Order.customer)
+
+
+def _options_by_product(session, product_ids):
+    options = defaultdict(list)
+    for ids in chunked(product_ids):
+        rows = session.execute(
+            select(
+                ProductOption.product_id,
+                ProductOption.id,
+                ProductOption.option_name,
+                ProductOption.variant,
+            ).where(ProductOption.product_id.in_(ids))
+        )
+        for product_id, option_id, option_name, variant in rows:
+            options[product_id].append(
+                {"id": option_id, "option_name": option_name, "variant": variant}
+            )
+    return options
+
+
+def load_products(session, order_ids) -> dict:
+    """
+    The products of the orders, with their options, as OrderSchema shapes
+    them, keyed by order_id; one SELECT per chunk of orders and of products.
+    """
+    rows = []
+    for ids in chunked(order_ids):
+        rows += session.execute(
+            select(
+                Product.order_id,
+                Product.id,
+                Product.name,
+                Product.sku,
+                Product.price,
+                Product.quantity,
+                Product.amount,
+                Product.is_assembled,
+            ).where(Product.order_id.in_(ids))
+        ).all()
+    options = _options_by_product(session, [row.id for row in rows])
+
+    products = defaultdict(list)
+    for row in rows:
+        products[row.order_id].append(
+            {
+                "id": row.id,
+                "name": row.name,
+                "sku": row.sku,
+                "price": str(row.price),
+                "quantity": row.quantity,
+                "amount": str(row.amount),
+                "is_assembled": row.is_assembled,
+                "options": options[row.id],
+            }
+        )
+    return products
+
+
+def render_orders(rows, products: dict) -> bytes:
+    """
+    The JSON body of a List[OrderSchema] response for rows of
+    order_rows_query and their load_products, encoded with orjson. Byte for
+    byte what FastAPI renders from the ORM objects, without validating them
+    through pydantic.
+    """
+    return orjson.dumps(
+        [
+            {
+                "order_id": row.order_id,
+                "payment_system": row.payment_system,
+                "status": row.status.value,
+                "school": row.school,
+                "grade": row.grade,
+                "letter": row.letter,
+                "total_amount": str(row.total_amount),
+                "form_id": row.form_id,
+                "form_name": row.form_name,
+                "customer": {
+                    "id": row.customer_id,
+                    "name": row.customer_name,
+                    "phone": row.customer_phone,
+                    "email": row.customer_email,
+                },
+                # OrderSchema declares a datetime; the column is a date
+                "shipping_date": f"{row.shipping_date.isoformat()}T00:00:00",
+                "products": products[row.order_id],
+            }
+            for row in rows
+        ]
+    )
+
+
+def order_summary_query():
+    """
+    select() of the columns of the orders list summary, with how many of each
+    order's products are assembled and how many it has (assembled, total)
+    from one grouped query; filter and paginate it like order_rows_query.
+    """
+    assembled = func.sum(case((Product.is_assembled == True, 1), else_=0))
+    return (
+        select(
+            Order.order_id,
+            # An order has one customer; the aggregate is only there because
+            # PostgreSQL and MySQL (ONLY_FULL_GROUP_BY) reject ungrouped
+            # columns of another table, and grouping on them would stop the
+            # index walk below
+            func.max(Customer.name).label("customer_name"),
+            Order.school,
+            Order.grade,
+            Order.letter,
+            Order.status,
+            Order.total_amount,
+            Order.shipping_date,
+            func.coalesce(assembled, 0).label("assembled"),
+            func.count(Product.id).label("total"),
+        )
+        .outerjoin(Order.customer)
+        .outerjoin(Order.products)
+        # Grouped in keyset order, so the index walk stops after one page
+        # instead of aggregating every matching order first
+        .group_by(Order.shipping_date, Order.order_id)
+    )
+
+
+def render_summaries(rows) -> bytes:
+    """The JSON body of a List[OrderSummarySchema] response for rows of order_summary_query."""
+    return orjson.dumps(
+        [
+            {
+                "order_id": row.order_id,
+                "customer_name": row.customer_name,
+                "school": row.school,
+                "grade": row.grade,
+                "letter": row.letter,
+                "status": row.status.value,
+                "total_amount": str(row.total_amount),
+                "shipping_date": f"{row.shipping_date.isoformat()}T00:00:00",
+                "assembled": row.assembled,
+                "total": row.total,
+            }
+            for row in rows
+        ]
+    )
@@ -0,0 +1,238 @@
+# picklists.py
+import csv
+import html
+import io
+import multiprocessing
+import os
+import re
+import threading
+import zipfile
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy import select
+
+from database import engine
+from models import Customer, Order, Product, ProductOption
+from queries import filter_orders
+from utils import SCHOOLS
+
+# Classes are rendered in parallel on this many worker processes
+PICKLIST_WORKERS = int(os.getenv("PICKLIST_WORKERS", os.cpu_count() or 1))
+# Fewer product lines than this are rendered inline: handing the schools to
+# the pool costs ~35 ms even with warm workers, and rendering costs
+# ~0.06 ms a line (benchmarks.pick_lists)
+PICKLIST_POOL_MIN_LINES = int(os.getenv("PICKLIST_POOL_MIN_LINES", 5000))
+
+PICKLIST_COLUMNS = [
+    "order_id",
+    "customer_name",
+    "product_name",
+    "sku",
+    "options",
+    "quantity",
+    "is_assembled",
+]
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    # Started on first use and kept, so only the first generation pays for
+    # spawning the workers
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=PICKLIST_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _executor
+
+
+def shutdown_pool():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(cancel_futures=True)
+            _executor = None
+
+
+def load_classes(shipping_date: str = "closest", school: int = None):
+    """
+    Product lines of the orders shipping on shipping_date, grouped by class,
+    read with two plain SELECTs (lines, then their options).
+    Returns (school, grade, letter, lines) tuples of plain data that can be
+    sent to the worker processes.
+    """
+    orders = filter_orders(
+        select(Order.order_id), shipping_date=shipping_date, school=school
+    )
+    lines_query = (
+        select(
+            Order.school,
+            Order.grade,
+            Order.letter,
+            Order.order_id,
+            Customer.name,
+            Product.id,
+            Product.name,
+            Product.sku,
+            Product.quantity,
+            Product.is_assembled,
+        )
+        .select_from(Order)
+        .join(Order.products)
+        .outerjoin(Order.customer)
+        .where(Order.order_id.in_(orders))
+        .order_by(Order.order_id, Product.id)
+    )
+    options_query = (
+        select(
+            ProductOption.product_id, ProductOption.option_name, ProductOption.variant
+        )
+        .join(ProductOption.product)
+        .where(Product.order_id.in_(orders))
+        .order_by(ProductOption.id)
+    )
+
+    with engine.connect() as connection:
+        options = defaultdict(list)
+        for product_id, option_name, variant in connection.execute(options_query):
+            options[product_id].append(f"{option_name}: {variant}")
+
+        classes = defaultdict(list)
+        for row in connection.execute(lines_query):
+            classes[(row[0], row[1], row[2])].append(
+                {
+                    "order_id": row[3],
+                    "customer_name": row[4],
+                    "product_name": row[6],
+                    "sku": row[7],
+                    "options": "; ".join(options[row[5]]),
+                    "quantity": row[8],
+                    "is_assembled": bool(row[9]),
+                }
+            )
+    return [(*key, lines) for key, lines in sorted(classes.items())]
+
+
+def class_file_name(school: str, grade: int, letter: str) -> str:
+    number = next((key for key, name in SCHOOLS.items() if name == school), 0)
+    name = f"{number:02d} {school} {grade}{letter}"
+    return re.sub(r"[^\w\- ]", "", name).strip().replace(" ", "_")
+
+
+def _sku_totals(lines):
+    totals = defaultdict(int)
+    for line in lines:
+        totals[(line["product_name"], line["sku"], line["options"])] += line["quantity"]
+    return sorted(totals.items())
+
+
+def render_html(school: str, grade: int, letter: str, lines) -> str:
+    escape = html.escape
+    title = escape(f"{school}, {grade}{letter}")
+    totals = "".join(
+        f"<tr><td>{escape(name)}</td><td>{escape(sku)}</td>"
+        f"<td>{escape(options)}</td><td>{quantity}</td></tr>"
+        for (name, sku, options), quantity in _sku_totals(lines)
+    )
+    rows = "".join(
+        f"<tr><td>{escape(line['order_id'])}</td>"
+        f"<td>{escape(line['customer_name'] or '')}</td>"
+        f"<td>{escape(line['product_name'])}</td><td>{escape(line['sku'])}</td>"
+        f"<td>{escape(line['options'])}</td><td>{line['quantity']}</td>"
+        f"<td>{'&#9745;' if line['is_assembled'] else '&#9744;'}</td></tr>"
+        for line in lines
+    )
+    return (
+        '<!DOCTYPE html>\n<html><head><meta charset="utf-8">'
+        f"<title>{title}</title></head><body>"
+        f"<h1>{title}</h1>"
+        "<h2>Totals</h2><table border='1'>"
+        "<tr><th>Product</th><th>SKU</th><th>Options</th><th>Quantity</th></tr>"
+        f"{totals}</table>"
+        "<h2>Orders</h2><table border='1'>"
+        "<tr><th>Order</th><th>Customer</th><th>Product</th><th>SKU</th>"
+        "<th>Options</th><th>Quantity</th><th>Assembled</th></tr>"
+        f"{rows}</table></body></html>\n"
+    )
+
+
+def render_csv(lines) -> str:
+    # The BOM lets spreadsheet apps detect UTF-8, as in the order export
+    buffer = io.StringIO("\ufeff")
+    buffer.seek(0, io.SEEK_END)
+    writer = csv.DictWriter(buffer, fieldnames=PICKLIST_COLUMNS)
+    writer.writeheader()
+    writer.writerows(lines)
+    return buffer.getvalue()
+
+
+def write_class(directory: str, school: str, grade: int, letter: str, lines):
+    """Write one class's HTML and CSV sheets."""
+    base = os.path.join(directory, class_file_name(school, grade, letter))
+    with open(f"{base}.html", "w", encoding="utf-8") as f:
+        f.write(render_html(school, grade, letter, lines))
+    with open(f"{base}.csv", "w", encoding="utf-8", newline="") as f:
+        f.write(render_csv(lines))
+    return [f"{base}.html", f"{base}.csv"]
+
+
+def write_classes(directory: str, classes):
+    """Write the sheets of several classes; the unit of work of a worker process."""
+    return [
+        path for pick_class in classes for path in write_class(directory, *pick_class)
+    ]
+
+
+def generate_pick_lists(
+    directory: str, shipping_date: str = "closest", school: int = None
+):
+    """
+    Render the pick-lists of every class shipping on shipping_date into
+    directory. Above PICKLIST_POOL_MIN_LINES product lines each school's
+    classes are one task on the process pool, so the schools render in
+    parallel; smaller loads, a single school or a single worker are rendered
+    in this process.
+    Returns the paths of the written files.
+    """
+    os.makedirs(directory, exist_ok=True)
+    classes = load_classes(shipping_date, school)
+    schools = defaultdict(list)
+    for pick_class in classes:
+        schools[pick_class[0]].append(pick_class)
+    lines = sum(len(pick_class[3]) for pick_class in classes)
+    if PICKLIST_WORKERS <= 1 or len(schools) <= 1 or lines < PICKLIST_POOL_MIN_LINES:
+        return write_classes(directory, classes)
+
+    futures = [
+        _get_executor().submit(write_classes, directory, classes)
+        for classes in schools.values()
+    ]
+    return [path for future in futures for path in future.result()]
+
+
+def zip_files(paths) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for path in paths:
+            archive.write(path, os.path.basename(path))
+    return buffer.getvalue()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Write the pick-lists of a shipping date"
+    )
+    parser.add_argument("directory")
+    parser.add_argument("--shipping-date", default="closest")
+    parser.add_argument("--school", type=int)
+    args = parser.parse_args()
+    paths = generate_pick_lists(args.directory, args.shipping_date, args.school)
+    shutdown_pool()
+    print(f"{len(paths)} files written to {args.directory}")
@@ -0,0 +1,107 @@
+# queries.py
+import base64
+import binascii
+import json
+from datetime import date, datetime
+
+from fastapi import HTTPException
+from sqlalchemy import tuple_
+
+from models import Order, StatusEnum
+from utils import SCHOOLS, get_next_shipping_day
+
+DEFAULT_PAGE_SIZE = 200
+MAX_PAGE_SIZE = 1000
+
+# Every status an order can have once it has been paid for
+PAID_STATUSES = [status for status in StatusEnum if status != StatusEnum.new]
+
+
+def filter_orders(
+    query,
+    shipping_date: str = None,
+    school: int = None,
+    grade: str = None,
+    letter: str = None,
+    payed: bool = None,
+):
+    """
+    Apply the GET /orders/ filters to a query or select() over Order.
+    Shared by every endpoint that accepts the same filter set.
+    """
+    closest_shipping_date = get_next_shipping_day(datetime.now())
+    next_shipping_date = get_next_shipping_day(closest_shipping_date)
+    closest_shipping_date = closest_shipping_date.date()
+    next_shipping_date = next_shipping_date.date()
+
+    # Filter by shipping_date
+    if shipping_date:
+        if shipping_date == "closest":
+            query = query.filter(Order.shipping_date == closest_shipping_date)
+        elif shipping_date == "next":
+            query = query.filter(Order.shipping_date == next_shipping_date)
+        elif shipping_date == "previous":
+            query = query.filter(Order.shipping_date < closest_shipping_date)
+        else:
+            raise HTTPException(status_code=400, detail="Invalid shipping date filter")
+
+    if school:
+        query = query.filter(Order.school == SCHOOLS[school])
+
+    # Filter by grade
+    if grade:
+        query = query.filter(Order.grade == grade)
+
+    # Filter by grade and letter (if both are provided)
+    if letter:
+        if not grade:
+            raise HTTPException(
+                status_code=400, detail="Grade must be provided if filtering by letter"
+            )
+        query = query.filter(Order.grade == grade, Order.letter == letter)
+
+    if payed is not None:
+        if payed == True:
+            # IN rather than != so the status index can be used
+            query = query.filter(Order.status.in_(PAID_STATUSES))
+        else:
+            query = query.filter(Order.status == StatusEnum.new)
+
+    return query
+
+
+def encode_cursor(order: Order) -> str:
+    """Build the opaque cursor pointing just past the given order."""
+    key = [order.shipping_date.isoformat(), order.order_id]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    try:
+        shipping_date, order_id = json.loads(base64.urlsafe_b64decode(cursor))
+        return date.fromisoformat(shipping_date), str(order_id)
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def paginate_orders(query, cursor: str = None, limit: int = DEFAULT_PAGE_SIZE):
+    """
+    Keyset pagination over (shipping_date, order_id).
+    Limits the query to one page plus a lookahead row; pass the fetched rows to
+    split_page to get the page and the cursor of the next one.
+    Seeking past the cursor instead of using OFFSET keeps deep pages as cheap as the first.
+    """
+    if cursor:
+        query = query.filter(
+            tuple_(Order.shipping_date, Order.order_id) > decode_cursor(cursor)
+        )
+    # Fetch one extra row to know whether another page exists
+    return query.order_by(Order.shipping_date, Order.order_id).limit(limit + 1)
+
+
+def split_page(orders, limit: int = DEFAULT_PAGE_SIZE):
+    """Returns the page of orders and the next cursor (None on the last page)."""
+    if len(orders) > limit:
+        orders = orders[:limit]
+        return orders, encode_cursor(orders[-1])
+    return orders, None
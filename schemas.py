@@ -80,6 +80,24 @@ class OrderSchema(BaseModel):
         orm_mode = True
 
 
+# One line of the orders list without the nested customer and products:
+# assembled and total count the order's products
+class OrderSummarySchema(BaseModel):
+    order_id: str
+    customer_name: Optional[str]
+    school: str
+    grade: int
+    letter: str
+    status: StatusEnum
+    total_amount: Decimal
+    shipping_date: datetime
+    assembled: int
+    total: int
+
+    class Config:
+        orm_mode = True
+
+
 class UserSchema(BaseModel):
     username: str
 
@@ -104,3 +122,55 @@ class TrackOrderSchema(BaseModel):
 
     class Config:
         orm_mode = True
+
+
+class BulkStatusUpdateSchema(BaseModel):
+    """Either order_ids or the GET /orders/ filters select the orders to update."""
+
+    status: StatusEnum
+    order_ids: Optional[List[str]] = None
+    # Only orders currently in this status are moved, e.g. processing -> shipped
+    from_status: Optional[StatusEnum] = None
+    shipping_date: Optional[str] = None
+    school: Optional[int] = None
+    grade: Optional[str] = None
+    letter: Optional[str] = None
+    payed: Optional[bool] = None
+
+
+class BulkStatusResultSchema(BaseModel):
+    order_id: str
+    # "updated", "unchanged" (already in the status), "skipped" (not in
+    # from_status, or changed by another request meanwhile) or "not_found"
+    outcome: str
+    previous_status: Optional[StatusEnum] = None
+
+
+class BulkStatusResponseSchema(BaseModel):
+    status: StatusEnum
+    updated: int
+    results: List[BulkStatusResultSchema] = []
+
+
+class BulkAssembleSchema(BaseModel):
+    """Exactly one of product_ids, order_ids or the class filters selects the products."""
+
+    assemble: bool = True
+    product_ids: Optional[List[int]] = None
+    order_ids: Optional[List[str]] = None
+    shipping_date: Optional[str] = None
+    school: Optional[int] = None
+    grade: Optional[str] = None
+    letter: Optional[str] = None
+
+
+class OrderAssemblySchema(BaseModel):
+    order_id: str
+    assembled: int
+    total: int
+    complete: bool
+
+
+class BulkAssembleResponseSchema(BaseModel):
+    updated: int
+    orders: List[OrderAssemblySchema] = []
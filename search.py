@@ -0,0 +1,352 @@
+# search.py
+import functools
+import hashlib
+import re
+from datetime import date
+
+from sqlalchemy import bindparam, exists, func, or_, select, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import aliased
+
+from bulk import chunked
+from database import engine
+from models import Customer, Order, Product
+from order_json import order_summary_query
+from utils import normalize_email, normalize_phone
+
+SEARCH_TABLE = "order_search"
+SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+# The trigram tokenizer cannot match anything shorter
+MIN_TERM_LENGTH = 3
+# Longer terms are looked up by their rarest part of this length, then
+# checked in full against the documents found
+SELECTIVE_PART_LENGTH = 5
+
+# FTS rowids are the days since _EPOCH of the order's shipping date followed by
+# this many bits of a hash of its order id, see _search_rowid
+ROWID_HASH_BITS = 47
+_EPOCH = date(1970, 1, 1)
+
+# SQLite gets an FTS5 index where its build has the trigram tokenizer
+# (3.34+); other databases and older builds fall back to unindexed LIKEs
+SEARCH_TOKENIZER = "trigram"
+
+_PHONE_QUERY = re.compile(r"[\d\s()+-]+")
+
+
+def _search_rowid(order_id: str, shipping_date) -> int:
+    # The FTS rowid of an order (orders has no integer key of its own that
+    # survives a VACUUM). The index lists matches in rowid order, so leading
+    # with the shipping date lets a search stop at the latest matches
+    days = (shipping_date - _EPOCH).days if shipping_date else 0
+    digest = hashlib.blake2b(str(order_id).encode(), digest_size=8).digest()
+    return days << ROWID_HASH_BITS | int.from_bytes(digest, "big") >> (
+        64 - ROWID_HASH_BITS
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def search_indexed() -> bool:
+    """Whether searches go through the FTS5 index, probed once per process."""
+    if engine.dialect.name != "sqlite":
+        return False
+    with engine.connect() as connection:
+        try:
+            connection.execute(
+                text(
+                    "CREATE VIRTUAL TABLE temp.search_probe USING fts5("
+                    f"probe, tokenize='{SEARCH_TOKENIZER}')"
+                )
+            )
+        except OperationalError as e:
+            print(f"Search falls back to LIKE: {e.orig}")
+            return False
+        connection.execute(text("DROP TABLE temp.search_probe"))
+    return True
+
+
+def create_search_index():
+    """
+    Create the search index if it is missing or outdated, filled from the
+    stored orders.
+    """
+    if not search_indexed():
+        return
+    with engine.begin() as connection:
+        found = connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE name = :name"),
+            {"name": SEARCH_TABLE},
+        ).first()
+        if found:
+            # Rowids of earlier versions were signed hashes of the order id
+            # alone; a shipping date never makes them negative
+            outdated = connection.execute(
+                text(f"SELECT 1 FROM {SEARCH_TABLE} WHERE rowid < 0 LIMIT 1")
+            ).first()
+            if not outdated:
+                return
+            connection.execute(text(f"DROP TABLE {SEARCH_TABLE}"))
+        # One document per order: the order id, its customer's name, phone
+        # (digits only, see utils.normalize_phone) and email, and the names
+        # and SKUs of its products, lowercased for the instr() checks below
+        connection.execute(
+            text(
+                f"CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5(order_id, name, "
+                f"phone, email, products, tokenize='{SEARCH_TOKENIZER}')"
+            )
+        )
+        _index(connection)
+
+
+def _documents(connection, condition):
+    rows = connection.execute(
+        select(
+            Order.order_id,
+            Order.shipping_date,
+            Customer.name,
+            Customer.phone,
+            Customer.email,
+            func.group_concat(Product.name, " "),
+            func.group_concat(Product.sku, " "),
+        )
+        .outerjoin(Order.customer)
+        .outerjoin(Order.products)
+        .where(condition)
+        .group_by(Order.order_id)
+    )
+    return [
+        {
+            "rowid": _search_rowid(order_id, shipping_date),
+            "order_id": order_id,
+            "name": (name or "").lower(),
+            "phone": normalize_phone(phone),
+            "email": normalize_email(email),
+            "products": f"{names or ''} {skus or ''}".strip().lower(),
+        }
+        for order_id, shipping_date, name, phone, email, names, skus in rows
+    ]
+
+
+def _index(connection, condition=True, replace=False):
+    """Write the documents of the orders matching condition, replacing old ones if asked."""
+    documents = _documents(connection, condition)
+    if replace:
+        delete = text(f"DELETE FROM {SEARCH_TABLE} WHERE rowid IN :rowids")
+        delete = delete.bindparams(bindparam("rowids", expanding=True))
+        for chunk in chunked([document["rowid"] for document in documents]):
+            connection.execute(delete, {"rowids": chunk})
+    if documents:
+        connection.execute(
+            text(
+                f"INSERT INTO {SEARCH_TABLE} "
+                "(rowid, order_id, name, phone, email, products) VALUES "
+                "(:rowid, :order_id, :name, :phone, :email, :products)"
+            ),
+            documents,
+        )
+
+
+def index_customer_orders(session, customer_id: int):
+    """
+    Bring the search documents of a customer's orders up to date, within the
+    session's transaction. Run once an order is staged: the customer upsert
+    may also have changed the contact details of their earlier orders.
+    """
+    if search_indexed():
+        _index(session, Order.customer_id == customer_id, replace=True)
+
+
+def rebuild_search_index():
+    """Rewrite the whole search index from the orders table."""
+    if not search_indexed():
+        return
+    create_search_index()
+    with engine.begin() as connection:
+        connection.execute(text(f"DELETE FROM {SEARCH_TABLE}"))
+        _index(connection)
+        # Merge the index segments written by the bulk insert
+        connection.execute(
+            text(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')")
+        )
+
+
+def _alternatives(word: str) -> set:
+    if _PHONE_QUERY.fullmatch(word):
+        digits = re.sub(r"\D", "", word)
+        alternatives = {digits, normalize_phone(digits)}
+        if digits.startswith("8"):
+            # The local trunk prefix of a partial number, which
+            # normalize_phone cannot tell from its length
+            alternatives |= {"7" + digits[1:], digits[1:]}
+        return alternatives
+    return {word.lower()}
+
+
+def search_terms(q: str):
+    """
+    The words of a search query that can be matched, each as a set of
+    alternatives. Phone numbers are reduced to digits and also tried in their
+    normalized form; a leading 8 is also tried as 7 and dropped, so
+    "8 (707) 646" finds "+7 707 646 ...". A query made only of digits and
+    phone punctuation is a single term.
+    """
+    q = q.strip()
+    words = [q] if _PHONE_QUERY.fullmatch(q) else q.split()
+    terms = [
+        {value for value in _alternatives(word) if len(value) >= MIN_TERM_LENGTH}
+        for word in words
+    ]
+    return [alternatives for alternatives in terms if alternatives]
+
+
+def _selective_part(value: str) -> str:
+    """
+    The part of a long term the index looks up: the one with the most digits,
+    as ids, phone numbers and the numbers in emails are far rarer than
+    letters. Matching a whole "name@gmail.com" would read the huge lists of
+    documents containing "gma", "com" and the like.
+    """
+    if len(value) <= SELECTIVE_PART_LENGTH:
+        return value
+    parts = [
+        value[start : start + SELECTIVE_PART_LENGTH]
+        for start in range(len(value) - SELECTIVE_PART_LENGTH + 1)
+    ]
+    # Ties go to the end of the term: phone numbers share their prefixes
+    return max(
+        reversed(parts), key=lambda part: (sum(map(str.isdigit, part)), len(set(part)))
+    )
+
+
+def _phrase(value: str) -> str:
+    # Quoted, so the query syntax of FTS5 does not apply to user input
+    return '"' + value.replace('"', '""') + '"'
+
+
+def _match_condition(terms):
+    """
+    WHERE clause over the index, and its parameters, for the documents
+    containing every term: the index finds the documents containing the
+    selective part of each term and instr() checks they contain the whole term
+    where that part is not all of it.
+    """
+    document = (
+        "(lower(order_id) || ' ' || name || ' ' || phone || ' ' || email || ' ' "
+        "|| products)"
+    )
+    params = {}
+    matches, checks = [], []
+    for term, alternatives in enumerate(terms):
+        values = sorted(alternatives)
+        phrases = [_phrase(_selective_part(value)) for value in values]
+        matches.append("(" + " OR ".join(phrases) + ")")
+        # A phrase is matched as a substring, so short terms need no check,
+        # which would read every matching document
+        if all(len(value) <= SELECTIVE_PART_LENGTH for value in values):
+            continue
+        contains = []
+        for alternative, value in enumerate(values):
+            name = f"term_{term}_{alternative}"
+            params[name] = value
+            contains.append(f"instr({document}, :{name})")
+        checks.append("(" + " OR ".join(contains) + ")")
+    params["match"] = " AND ".join(matches)
+    return " AND ".join([f"{SEARCH_TABLE} MATCH :match", *checks]), params
+
+
+def _match_order_ids(session, terms, limit: int):
+    """
+    Ids of the latest limit indexed orders containing every term, in the
+    order of the summary: latest shipping date first, then by order id.
+    """
+    condition, params = _match_condition(terms)
+    # The index lists matches by rowid, so this reads no more of them than
+    # it returns, however common the terms are
+    latest = session.scalars(
+        text(
+            f"SELECT rowid FROM {SEARCH_TABLE} WHERE {condition} "
+            "ORDER BY rowid DESC LIMIT :limit"
+        ),
+        {**params, "limit": limit},
+    ).all()
+    if len(latest) < limit:
+        since = 0
+    else:
+        # Within a shipping date orders go by id, not rowid: read every match
+        # of the earliest date among the latest ones
+        since = latest[-1] >> ROWID_HASH_BITS << ROWID_HASH_BITS
+    return session.scalars(
+        text(
+            f"SELECT order_id FROM {SEARCH_TABLE} "
+            f"WHERE {condition} AND rowid >= :since "
+            f"ORDER BY rowid >> {ROWID_HASH_BITS} DESC, order_id LIMIT :limit"
+        ),
+        {**params, "since": since, "limit": limit},
+    ).all()
+
+
+def _contains(column, pattern):
+    # Case-insensitive for Cyrillic too; see database._add_sqlite_functions
+    if engine.dialect.name == "sqlite":
+        return func.unicode_lower(column).like(pattern)
+    return column.ilike(pattern)
+
+
+def _like_condition(terms):
+    # Unindexed equivalent of the FTS match for databases without FTS5;
+    # phones are compared as stored. The summary query joins products itself,
+    # so the EXISTS goes through an alias to stay correlated to orders only
+    product = aliased(Product)
+    conditions = []
+    for alternatives in terms:
+        matches = []
+        for value in alternatives:
+            pattern = f"%{value}%"
+            matches += [
+                Order.order_id.like(pattern),
+                _contains(Customer.name, pattern),
+                Customer.phone.like(pattern),
+                _contains(Customer.email, pattern),
+                exists().where(
+                    product.order_id == Order.order_id,
+                    or_(
+                        _contains(product.name, pattern),
+                        _contains(product.sku, pattern),
+                    ),
+                ),
+            ]
+        conditions.append(or_(*matches))
+    return conditions
+
+
+def search_orders(session, q: str, limit: int = SEARCH_LIMIT):
+    """
+    Summary rows (see order_json.order_summary_query) of up to limit orders
+    matching every term of q in their id, customer name, phone or email, or
+    product names and SKUs; latest shipping date first.
+    """
+    terms = search_terms(q)
+    if not terms:
+        return []
+
+    if search_indexed():
+        order_ids = _match_order_ids(session, terms, limit)
+        if not order_ids:
+            return []
+        conditions = [Order.order_id.in_(order_ids)]
+    else:
+        conditions = _like_condition(terms)
+    # Sorted before the limit, so common terms return the latest orders
+    # rather than the first ones the index comes across
+    return session.execute(
+        order_summary_query()
+        .where(*conditions)
+        .order_by(Order.shipping_date.desc(), Order.order_id)
+        .limit(limit)
+    ).all()
+
+
+if __name__ == "__main__":
+    rebuild_search_index()
+    print("Search index rebuilt.")
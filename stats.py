@@ -0,0 +1,89 @@
+# stats.py
+from decimal import Decimal
+
+from fastapi import HTTPException
+from sqlalchemy import case, func, select, type_coerce
+
+from models import Order, Product, ProductOption, StatusEnum
+
+# Order columns the dashboard tables can be split by
+GROUP_COLUMNS = {
+    "shipping_date": Order.shipping_date,
+    "school": Order.school,
+    "grade": Order.grade,
+    "letter": Order.letter,
+}
+DEFAULT_GROUP_BY = "shipping_date,school"
+
+
+def parse_group_by(group_by: str):
+    names = [name.strip() for name in group_by.split(",") if name.strip()]
+    unknown = [name for name in names if name not in GROUP_COLUMNS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid group_by. Valid columns are: {', '.join(GROUP_COLUMNS)}",
+        )
+    return list(dict.fromkeys(names))
+
+
+def order_totals_query(group_by: list):
+    """Order count, unpaid count and revenue (paid, not canceled) per group."""
+    columns = [GROUP_COLUMNS[name] for name in group_by]
+    revenue = type_coerce(
+        func.sum(
+            case(
+                (Order.status.in_([StatusEnum.new, StatusEnum.canceled]), 0),
+                else_=Order.total_amount,
+            )
+        ),
+        Order.total_amount.type,
+    )
+    unpaid = func.sum(case((Order.status == StatusEnum.new, 1), else_=0))
+    return (
+        select(
+            *columns,
+            func.count(Order.order_id).label("orders"),
+            unpaid.label("unpaid"),
+            revenue.label("revenue"),
+        )
+        .group_by(*columns)
+        .order_by(*columns)
+    )
+
+
+def product_units_query(group_by: list):
+    """
+    Units ordered per SKU and option variant (size, colour...) per group.
+    A product with several options is counted once under each of them;
+    products without options are grouped under a null option.
+    """
+    columns = [GROUP_COLUMNS[name] for name in group_by] + [
+        Product.sku,
+        ProductOption.option_name,
+        ProductOption.variant,
+    ]
+    return (
+        select(
+            *columns,
+            func.sum(Product.quantity).label("units"),
+            func.count(func.distinct(Order.order_id)).label("orders"),
+        )
+        .select_from(Order)
+        .join(Order.products)
+        .outerjoin(Product.options)
+        .group_by(*columns)
+        .order_by(*columns)
+    )
+
+
+def to_table(result):
+    """Compact {"columns": [...], "rows": [[...]]} form of a result."""
+    return {
+        "columns": list(result.keys()),
+        "rows": [
+            # Amounts keep their exact decimal form, as in OrderSchema
+            [str(value) if isinstance(value, Decimal) else value for value in row]
+            for row in result
+        ],
+    }
@@ -0,0 +1,5 @@
+# tests/conftest.py
+from benchmarks.common import configure
+
+# Before any test module imports database/main: a scratch SQLite database
+configure()
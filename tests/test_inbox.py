@@ -0,0 +1,53 @@
+# tests/test_inbox.py
+"""
+One bad webhook in the inbox is dead-lettered on its own; the entries
+around it are still ingested in the same batch.
+
+    python -m pytest tests
+"""
+
+import json
+
+from sqlalchemy import select
+
+from benchmarks.common import seed, tilda_payload
+from database import SessionLocal
+from inbox import process_inbox_batch
+from models import InboxStatusEnum, Order, WebhookInboxEntry
+
+
+def test_malformed_payload_does_not_block_the_batch():
+    seed(orders=0)
+    bad = tilda_payload(900001)
+    # Passes the payload checks, fails in the customer upsert
+    bad["Email"] = 12345
+    payloads = [tilda_payload(900000), bad, tilda_payload(900002), "{not json"]
+
+    db = SessionLocal()
+    try:
+        entries = [
+            WebhookInboxEntry(
+                payload=payload if isinstance(payload, str) else json.dumps(payload)
+            )
+            for payload in payloads
+        ]
+        db.add_all(entries)
+        db.commit()
+        ids = [entry.id for entry in entries]
+
+        assert process_inbox_batch(db) == len(payloads)
+
+        db.expire_all()
+        stored = {entry.id: entry for entry in db.scalars(select(WebhookInboxEntry))}
+        statuses = [stored[id].status for id in ids]
+        assert statuses == [
+            InboxStatusEnum.processed,
+            InboxStatusEnum.dead,
+            InboxStatusEnum.processed,
+            InboxStatusEnum.dead,
+        ]
+        assert all(stored[id].attempts == 1 for id in ids)
+        assert "email must be a string" in stored[ids[1]].last_error
+        assert set(db.scalars(select(Order.order_id))) == {"900000", "900002"}
+    finally:
+        db.close()
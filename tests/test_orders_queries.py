@@ -0,0 +1,53 @@
+# tests/test_orders_queries.py
+"""
+GET /orders/ runs a fixed number of SQL statements, whatever the number of
+orders it returns (no lazy loads per order, product or option).
+
+    python -m pytest tests
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from benchmarks.common import auth_headers, seed
+from database import async_engine, engine
+from queries import MAX_PAGE_SIZE
+
+
+@pytest.fixture
+def client():
+    import main
+
+    with TestClient(main.app) as client:
+        yield client
+
+
+def count_statements(client, headers, orders: int) -> int:
+    seed(orders)
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    targets = [engine] + ([async_engine.sync_engine] if async_engine else [])
+    for target in targets:
+        event.listen(target, "before_cursor_execute", record)
+    try:
+        response = client.get(
+            "/orders/", params={"limit": MAX_PAGE_SIZE}, headers=headers
+        )
+    finally:
+        for target in targets:
+            event.remove(target, "before_cursor_execute", record)
+    assert response.status_code == 200
+    assert len(response.json()) == orders
+    return len(statements)
+
+
+def test_statement_count_does_not_grow_with_orders(client):
+    # One token throughout, and a warm-up request to cache its user, so both
+    # counts leave the login out
+    headers = auth_headers()
+    count_statements(client, headers, 1)
+    assert count_statements(client, headers, 5) == count_statements(client, headers, 50)
@@ -0,0 +1,113 @@
+# tests/test_query_plans.py
+"""
+Every GET /orders/ and /orders/summary filter combination, and the lookups by
+key, is served by the index meant for it rather than a full table scan.
+
+    python -m pytest tests
+"""
+
+import pytest
+from sqlalchemy import select, text
+
+from benchmarks.common import filter_combinations
+from database import create_schema, engine
+from models import Base, Order, Product, ProductOption, StatusChange
+from order_json import order_rows_query, order_summary_query
+from queries import filter_orders, paginate_orders
+
+# The orders index each filter is served by; letter only narrows grade
+FILTER_INDEXES = {
+    "shipping_date": "ix_orders_shipping_date_order_id",
+    "school": "ix_orders_school_grade_letter_shipping_date",
+    "grade": "ix_orders_grade_letter_shipping_date",
+    "payed": "ix_orders_status_shipping_date",
+}
+# Unfiltered listings walk the keyset ordering from the start
+UNFILTERED_PLAN = "SCAN orders USING INDEX ix_orders_shipping_date_order_id"
+
+VIEWS = {"rows": order_rows_query, "summary": order_summary_query}
+
+LOOKUPS = {
+    "order by id": (
+        lambda: select(Order).where(Order.order_id == "1"),
+        "orders",
+        {"sqlite_autoindex_orders_1", "ix_orders_order_id"},
+    ),
+    "products of orders": (
+        lambda: select(Product).where(Product.order_id.in_(["1", "2"])),
+        "products",
+        {"ix_products_order_id"},
+    ),
+    "options of products": (
+        lambda: select(ProductOption).where(ProductOption.product_id.in_([1, 2])),
+        "product_options",
+        {"ix_product_options_product_id"},
+    ),
+    "status changes of orders": (
+        lambda: select(StatusChange).where(StatusChange.order_id.in_(["1", "2"])),
+        "status_changes",
+        {"ix_status_changes_order_id"},
+    ),
+}
+
+
+@pytest.fixture(scope="module")
+def connection():
+    create_schema(Base.metadata)
+    # EXPLAIN does not reload a schema changed by another connection, so start
+    # from fresh connections that see any index create_schema just added
+    engine.dispose()
+    with engine.connect() as connection:
+        yield connection
+
+
+def explain(connection, statement):
+    sql = statement.compile(engine, compile_kwargs={"literal_binds": True})
+    rows = connection.execute(text(f"EXPLAIN QUERY PLAN {sql}"))
+    return [row.detail for row in rows]
+
+
+def table_steps(plan, table):
+    return [
+        step
+        for step in plan
+        if step.split()[:1] in (["SCAN"], ["SEARCH"]) and step.split()[1] == table
+    ]
+
+
+def filter_id(filters):
+    return ",".join(f"{k}={v}" for k, v in filters.items() if v is not None) or "none"
+
+
+@pytest.mark.parametrize("view", VIEWS)
+@pytest.mark.parametrize("filters", list(filter_combinations()), ids=filter_id)
+def test_order_filters_use_their_index(connection, view, filters):
+    query = paginate_orders(filter_orders(VIEWS[view](), **filters), limit=100)
+    plan = explain(connection, query)
+    steps = table_steps(plan, "orders")
+    assert steps, plan
+
+    intended = {
+        FILTER_INDEXES[name]
+        for name, value in filters.items()
+        if value is not None and name in FILTER_INDEXES
+    }
+    for step in steps:
+        if intended:
+            assert step.startswith("SEARCH orders USING INDEX"), plan
+            assert step.split()[4] in intended, plan
+        else:
+            assert step == UNFILTERED_PLAN, plan
+    # Nor is any joined table scanned in full
+    assert not [s for s in plan if s.startswith("SCAN") and s != UNFILTERED_PLAN]
+
+
+@pytest.mark.parametrize("name", LOOKUPS)
+def test_lookups_by_key_use_their_index(connection, name):
+    statement, table, indexes = LOOKUPS[name]
+    plan = explain(connection, statement())
+    steps = table_steps(plan, table)
+    assert steps, plan
+    for step in steps:
+        assert step.startswith(f"SEARCH {table} USING"), plan
+        assert any(index in step for index in indexes), plan
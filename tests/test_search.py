@@ -0,0 +1,53 @@
+# tests/test_search.py
+"""
+Order search finds the same orders through the FTS5 index and through the
+LIKE fallback used where SQLite lacks FTS5 or its trigram tokenizer.
+
+    python -m pytest tests
+"""
+
+import pytest
+
+import search
+from benchmarks.common import seed
+from database import SessionLocal
+
+QUERIES = ["parent 123", "parent17@example.com", "100042", "vest", "жилет"]
+
+
+@pytest.fixture
+def db():
+    seed(orders=300)
+    session = SessionLocal()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def without_trigram(monkeypatch):
+    # As on SQLite builds before 3.34, or without FTS5 at all
+    monkeypatch.setattr(search, "SEARCH_TOKENIZER", "missing")
+    search.search_indexed.cache_clear()
+    yield
+    search.search_indexed.cache_clear()
+
+
+def order_ids(session, q):
+    return [row.order_id for row in search.search_orders(session, q)]
+
+
+def test_unsupported_tokenizer_falls_back_to_like(db, without_trigram):
+    assert not search.search_indexed()
+    # Starting up must not fail on the missing tokenizer
+    search.create_search_index()
+    assert order_ids(db, "100042") == ["100042"]
+
+
+@pytest.mark.parametrize("q", QUERIES)
+def test_fallback_finds_the_indexed_results(db, monkeypatch, q):
+    assert search.search_indexed()
+    indexed = order_ids(db, q)
+    assert indexed
+
+    monkeypatch.setattr(search, "search_indexed", lambda: False)
+    assert order_ids(db, q) == indexed
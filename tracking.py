@@ -0,0 +1,62 @@
+# tracking.py
+import hashlib
+import os
+import threading
+
+from schemas import TrackOrderSchema
+from utils import TTLCache
+
+# Serialized /order-tracking responses are kept for this many seconds and
+# dropped as soon as this process changes the order; the TTL bounds how stale
+# an entry can get when another process changed it
+TRACKING_CACHE_TTL = float(os.getenv("TRACKING_CACHE_TTL", 30))
+TRACKING_CACHE_SIZE = int(os.getenv("TRACKING_CACHE_SIZE", 4096))
+
+_responses = TTLCache(TRACKING_CACHE_SIZE, TRACKING_CACHE_TTL)
+
+# Bumped by every invalidation, so a response rendered from rows read before
+# a concurrent change is not cached after that change was invalidated
+_generation = 0
+_generation_lock = threading.Lock()
+
+
+def generation() -> int:
+    return _generation
+
+
+def cached_response(order_id: str):
+    """The (etag, body) cached for the order, or None."""
+    return _responses.get(order_id)
+
+
+def render_response(order, since_generation: int):
+    """
+    Serialize an order as TrackOrderSchema JSON and cache it, unless the
+    order was invalidated after since_generation. Returns (etag, body).
+    """
+    body = (
+        TrackOrderSchema.model_validate(order, from_attributes=True)
+        .model_dump_json()
+        .encode()
+    )
+    etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+    with _generation_lock:
+        if _generation == since_generation:
+            _responses.set(order.order_id, (etag, body))
+    return etag, body
+
+
+def invalidate(*order_ids):
+    """Forget the cached tracking responses of orders that changed."""
+    global _generation
+    with _generation_lock:
+        _generation += 1
+        for order_id in order_ids:
+            _responses.pop(str(order_id))
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
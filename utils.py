@@ -1,3 +1,7 @@
+import re
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 
 
@@ -55,3 +59,95 @@ def get_next_shipping_day(order_date: datetime) -> datetime:
     else:
         # Otherwise, move to the next valid shipping Sunday (add the remaining days to reach the next cycle)
         return next_sunday + timedelta(weeks=1)
+
+
+def _text(value, field: str) -> str:
+    # Contact details come straight from webhook payloads
+    if value is None:
+        return ""
+    if not isinstance(value, str):
+        raise TypeError(f"{field} must be a string, not {type(value).__name__}")
+    return value
+
+
+def normalize_phone(phone: str) -> str:
+    """
+    Reduce a phone number to its digits in international form,
+    so "+7 (707) 123-45-67" and "87071234567" compare equal.
+    Raises TypeError when phone is neither a string nor None.
+    """
+    digits = re.sub(r"\D", "", _text(phone, "phone"))
+    if len(digits) == 11 and digits.startswith("8"):
+        digits = "7" + digits[1:]
+    elif len(digits) == 10:
+        digits = "7" + digits
+    return digits
+
+
+def normalize_email(email: str) -> str:
+    """Raises TypeError when email is neither a string nor None."""
+    return _text(email, "email").strip().lower()
+
+
+def customer_contact_key(email: str, phone: str):
+    """
+    The key a customer is deduplicated on, or None when they gave neither an
+    email nor a phone: such customers have nothing to be matched on and are
+    never merged.
+    """
+    email, phone = normalize_email(email), normalize_phone(phone)
+    if not email and not phone:
+        return None
+    return f"{email}|{phone}"
+
+
+class TTLCache:
+    """
+    A bounded LRU mapping whose entries expire after a time-to-live.
+    Safe to share between the event loop and threadpool workers.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: float = None):
+        """Store a value; ttl may shorten the default time-to-live for this entry."""
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            return default if entry is None else entry[0]
+
+    def discard_where(self, predicate):
+        """Drop every entry whose value matches the predicate."""
+        with self._lock:
+            for key in [k for k, (v, _) in self._entries.items() if predicate(v)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
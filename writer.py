@@ -0,0 +1,143 @@
+# writer.py
+import asyncio
+import os
+
+from sqlalchemy.exc import SQLAlchemyError
+from starlette.concurrency import run_in_threadpool
+
+from database import begin_write
+
+# "direct" commits each request's writes on its own session, "group" hands
+# them to the GroupCommitWriter below
+WRITE_MODE = os.getenv("WRITE_MODE", "direct")
+
+# How long the writer waits for more units once one arrives, and the most
+# units it commits together
+GROUP_COMMIT_WINDOW_MS = float(os.getenv("GROUP_COMMIT_WINDOW_MS", 2))
+GROUP_COMMIT_MAX_BATCH = int(os.getenv("GROUP_COMMIT_MAX_BATCH", 64))
+
+
+class GroupCommitWriter:
+    """
+    Single writer for the write units of concurrent requests. A unit is a
+    function of a sync Session that stages its changes without committing;
+    the writer runs the units it has collected one after the other and
+    commits them together, so a batch pays for one transaction and one fsync
+    instead of one per request. Each caller gets its own unit's result or
+    exception back.
+    """
+
+    def __init__(
+        self,
+        session_factory,
+        window_ms: float = GROUP_COMMIT_WINDOW_MS,
+        max_batch: int = GROUP_COMMIT_MAX_BATCH,
+    ):
+        self.session_factory = session_factory
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.queue = None
+        self._loop = None
+        self._task = None
+
+    def start(self):
+        # Like the Mailer, the writer belongs to the loop that started it
+        loop = asyncio.get_running_loop()
+        if self._task and self._loop is loop:
+            return
+        self._loop = loop
+        self.queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 10):
+        """Commit what is still queued (up to timeout), then stop the writer."""
+        if not self._task:
+            return
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            print(f"Writer stopped with {self.queue.qsize()} writes uncommitted")
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def submit(self, unit, *args):
+        """Run unit(session, *args) in the next batch; returns once it is committed."""
+        self.start()
+        future = self._loop.create_future()
+        self.queue.put_nowait((future, unit, args))
+        return await future
+
+    async def _collect(self):
+        batch = [await self.queue.get()]
+        deadline = self._loop.time() + self.window
+        while len(batch) < self.max_batch:
+            if not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                continue
+            timeout = deadline - self._loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            try:
+                outcomes = await run_in_threadpool(self._commit_batch, batch)
+            except Exception as e:
+                outcomes = [(False, e)] * len(batch)
+            for (future, _, _), (ok, value) in zip(batch, outcomes):
+                if not future.done():
+                    if ok:
+                        future.set_result(value)
+                    else:
+                        future.set_exception(value)
+                self.queue.task_done()
+
+    def _commit_batch(self, batch):
+        """
+        Commit the batch's units in one transaction and return an (ok, value)
+        outcome per unit. Each unit runs in a SAVEPOINT, so one that raises
+        gets its exception back and only its own changes are rolled back; if
+        the commit itself fails, the units are redone one commit at a time so
+        the failure reaches only the unit causing it.
+        """
+        outcomes = []
+        with self.session_factory() as session:
+            begin_write(session)
+            for _, unit, args in batch:
+                try:
+                    # Released (and so flushed) on success, so later units
+                    # see the changes
+                    with session.begin_nested():
+                        result = unit(session, *args)
+                    outcomes.append((True, result))
+                except Exception as e:
+                    outcomes.append((False, e))
+                # Detached so later units cannot alter what this unit returns
+                session.expunge_all()
+            try:
+                session.commit()
+            except SQLAlchemyError:
+                session.rollback()
+                outcomes = [
+                    self._commit_one(session, item) if ok else (ok, value)
+                    for item, (ok, value) in zip(batch, outcomes)
+                ]
+        return outcomes
+
+    def _commit_one(self, session, item):
+        _, unit, args = item
+        try:
+            result = unit(session, *args)
+            session.commit()
+            session.expunge_all()
+            return True, result
+        except Exception as e:
+            session.rollback()
+            return False, e